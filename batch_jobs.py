@@ -0,0 +1,231 @@
+"""
+Пакетная обработка списка фильмов с возобновлением после сбоев.
+
+Примеры:
+    python batch_jobs.py enqueue --db jobs.db 301 2013 --file ids.txt
+    python batch_jobs.py work --db jobs.db --processes 4
+    python batch_jobs.py status --db jobs.db
+    python batch_jobs.py export --db jobs.db --out films.xlsx
+
+API-ключи передаются через --api-key / --unofficial-api-key или переменные
+окружения KINOPOISK_API_KEY / KINOPOISK_UNOFFICIAL_API_KEY.
+Прерванный запуск продолжается повторной командой work: выполненные фильмы
+сохранены в базе, а задачи остановленных воркеров возвращаются по истечении аренды.
+Фильмы, загруженные в резервном режиме (unofficial API был недоступен), команда work
+с ключом unofficial API ставит в очередь заново, а в экспорте они отмечены колонкой
+«Резервный режим». Результат с меньшим кастом не заменяет сохраненный резервный.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+
+import pandas as pd
+
+from job_queue import JobQueue, default_worker_id
+from kinopoisk_api import CAST_PROFESSIONS, HEDGE_PERCENTILE, fetch_film, flatten_cast
+
+
+def is_poorer_than_stored(result, stored):
+    """Содержит ли новый результат меньше каста, чем сохраненный результат резервного режима"""
+    if stored is None or not stored[1]:
+        return False
+    return len(flatten_cast(result['cast'])) < len(flatten_cast(stored[0]['cast']))
+
+
+def print_lease_lost(worker_id, film_id):
+    print(f"[{worker_id}] {film_id}: аренда истекла и задача передана другому воркеру, "
+          f"результат отброшен", file=sys.stderr)
+
+
+def run_worker(db_path, api_key, unofficial_api_key=None, hedge_percentile=None,
+               lease_seconds=120, max_attempts=3, worker_id=None):
+    """Забирает задачи из очереди, пока они не закончатся. Возвращает число обработанных"""
+    worker_id = worker_id or default_worker_id()
+    queue = JobQueue(db_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    processed = 0
+    try:
+        while True:
+            film_id = queue.claim(worker_id)
+            if film_id is None:
+                break
+            try:
+                result, error, _ = fetch_film(film_id, api_key, unofficial_api_key, hedge_percentile)
+            except KeyboardInterrupt:
+                queue.release(film_id, worker_id)
+                raise
+            except Exception as e:
+                result, error = None, f'Ошибка обработки: {e}'
+            stored = None if error else queue.stored(film_id)
+            if error:
+                queue.fail(film_id, worker_id, error)
+                print(f"[{worker_id}] {film_id}: {error}", file=sys.stderr)
+            elif is_poorer_than_stored(result, stored):
+                # Например, unofficial API ответил 404 или ключ не принят: каст резервного
+                # режима из kinopoisk.dev полнее, оставляем его с признаком degraded
+                if queue.complete(film_id, worker_id, stored[0], degraded=True):
+                    print(f"[{worker_id}] {film_id}: новый каст меньше сохраненного, оставлен резервный")
+                else:
+                    print_lease_lost(worker_id, film_id)
+            elif queue.complete(film_id, worker_id, result, degraded=result['degraded']):
+                suffix = " (резервный режим)" if result['degraded'] else ""
+                print(f"[{worker_id}] {film_id}: готово{suffix}")
+            else:
+                print_lease_lost(worker_id, film_id)
+            processed += 1
+    finally:
+        queue.close()
+    return processed
+
+
+def build_export_frames(queue, professions=None):
+    """
+    Собирает таблицы фильмов и каста из выполненных задач.
+    professions — ключи профессий для экспорта каста (по умолчанию все).
+    """
+    films = []
+    cast_rows = []
+    for film_id, result, degraded in queue.completed():
+        films.append({'ID': film_id, **result['film_info'], 'Источник каста': result['data_source'],
+                      'Резервный режим': 'да' if degraded else 'нет'})
+        for label, line in flatten_cast(result['cast'], professions):
+            name, _, staff_id = line.partition(';')
+            cast_rows.append({'ID фильма': film_id, 'Профессия': label,
+                              'Имя': name.strip(), 'ID': staff_id.strip()})
+    df_cast = pd.DataFrame(cast_rows, columns=['ID фильма', 'Профессия', 'Имя', 'ID'])
+    return pd.DataFrame(films), df_cast
+
+
+def export_completed(db_path, out_path, professions=None):
+    """
+    Экспортирует выполненные задачи в Excel (.xlsx) или CSV. Возвращает число фильмов.
+    База открывается только для чтения (sqlite3.OperationalError, если ее нет)
+    """
+    queue = JobQueue(db_path, read_only=True)
+    try:
+        df_main, df_cast = build_export_frames(queue, professions)
+    finally:
+        queue.close()
+
+    if out_path.lower().endswith('.xlsx'):
+        with pd.ExcelWriter(out_path, engine='xlsxwriter') as writer:
+            df_main.to_excel(writer, sheet_name='Основная информация', index=False)
+            df_cast.to_excel(writer, sheet_name='Актеры и съемочная группа', index=False)
+    else:
+        output = io.StringIO()
+        output.write("=== ОСНОВНАЯ ИНФОРМАЦИЯ ===\n")
+        df_main.to_csv(output, index=False, sep=';', quoting=1)
+        output.write("\n=== АКТЕРЫ И СЪЕМОЧНАЯ ГРУППА ===\n")
+        df_cast.to_csv(output, index=False, sep=';', quoting=1)
+        # UTF-8 BOM для корректного открытия в Excel
+        with open(out_path, 'w', encoding='utf-8-sig', newline='') as f:
+            f.write(output.getvalue())
+    return len(df_main)
+
+
+def read_ids(ids, file_path=None):
+    """Собирает числовые ID из аргументов и файла (по одному или через пробел/запятую)"""
+    result = list(ids)
+    if file_path:
+        with open(file_path, encoding='utf-8') as f:
+            result.extend(f.read().replace(',', ' ').split())
+    invalid = [film_id for film_id in result if not film_id.isdigit()]
+    if invalid:
+        raise ValueError(f"Некорректные ID: {', '.join(invalid[:10])}")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная обработка фильмов Кинопоиска")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p_enqueue = subparsers.add_parser('enqueue', help="Добавить ID фильмов в очередь")
+    p_enqueue.add_argument('ids', nargs='*')
+    p_enqueue.add_argument('--file', help="Файл со списком ID")
+
+    p_work = subparsers.add_parser('work', help="Обработать очередь")
+    p_work.add_argument('--api-key', default=os.environ.get('KINOPOISK_API_KEY'))
+    p_work.add_argument('--unofficial-api-key', default=os.environ.get('KINOPOISK_UNOFFICIAL_API_KEY'))
+    p_work.add_argument('--hedge', action='store_true', help="Хеджированные запросы к unofficial API")
+    p_work.add_argument('--processes', type=int, default=1, help="Число процессов-воркеров")
+    p_work.add_argument('--lease', type=int, default=120, help="Время аренды задачи, с")
+    p_work.add_argument('--max-attempts', type=int, default=3)
+
+    subparsers.add_parser('status', help="Состояние очереди")
+    subparsers.add_parser('retry-failed', help="Вернуть неудачные задачи в очередь")
+
+    p_export = subparsers.add_parser('export', help="Экспорт выполненных задач")
+    p_export.add_argument('--out', required=True, help="Файл .xlsx или .csv")
+    p_export.add_argument('--professions', nargs='+', choices=[key for key, _ in CAST_PROFESSIONS],
+                          help="Профессии каста для экспорта (по умолчанию все)")
+
+    for p in subparsers.choices.values():
+        p.add_argument('--db', default='jobs.db', help="Файл базы очереди")
+
+    args = parser.parse_args(argv)
+
+    # Все команды, кроме enqueue, работают с существующей базой: опечатка в --db
+    # не должна создавать пустую базу
+    if args.command != 'enqueue' and not os.path.exists(args.db):
+        parser.error(f"База {args.db} не найдена (задачи добавляются командой enqueue)")
+
+    if args.command == 'enqueue':
+        try:
+            ids = read_ids(args.ids, args.file)
+        except ValueError as e:
+            parser.error(str(e))
+        queue = JobQueue(args.db)
+        added = queue.enqueue(ids)
+        queue.close()
+        print(f"Добавлено задач: {added} (уже в очереди: {len(ids) - added})")
+
+    elif args.command == 'work':
+        if not args.api_key:
+            parser.error("Не задан API-ключ kinopoisk.dev (--api-key или KINOPOISK_API_KEY)")
+        if args.unofficial_api_key:
+            # Без ключа unofficial API полный каст не получить — резервные результаты не трогаем
+            queue = JobQueue(args.db)
+            requeued = queue.requeue_degraded()
+            queue.close()
+            if requeued:
+                print(f"Повторно в очереди (резервный режим): {requeued}")
+        worker_args = (args.db, args.api_key, args.unofficial_api_key,
+                       HEDGE_PERCENTILE if args.hedge else None, args.lease, args.max_attempts)
+        if args.processes > 1:
+            workers = [multiprocessing.Process(target=run_worker, args=worker_args)
+                       for _ in range(args.processes)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        else:
+            run_worker(*worker_args)
+
+    elif args.command == 'status':
+        queue = JobQueue(args.db, read_only=True)
+        for state, count in queue.stats().items():
+            print(f"{state}: {count}")
+        print(f"результатов в резервном режиме: {queue.degraded_count()}")
+        for film_id, attempts, error in queue.failed():
+            print(f"  {film_id} (попыток: {attempts}): {error}")
+        queue.close()
+
+    elif args.command == 'retry-failed':
+        queue = JobQueue(args.db)
+        print(f"Возвращено в очередь: {queue.retry_failed()}")
+        queue.close()
+
+    elif args.command == 'export':
+        count = export_completed(args.db, args.out, args.professions)
+        print(f"Экспортировано фильмов: {count}")
+        queue = JobQueue(args.db, read_only=True)
+        degraded = queue.degraded_count()
+        queue.close()
+        if degraded:
+            print(f"Внимание: {degraded} фильмов загружено в резервном режиме (неполный каст), "
+                  f"повторите work для их обновления", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
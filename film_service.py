@@ -0,0 +1,288 @@
+"""
+Локальный HTTP-сервис с нормализованными данными о фильмах (JSON).
+
+    GET /films/{id}         — один фильм
+    GET /films?ids=1,2,3    — несколько фильмов
+
+Ответы берутся из кэша процесса, затем из базы пакетной обработки (--jobs-db,
+открывается только для чтения; результаты резервного режима из нее не берутся),
+и только после этого запрашиваются у API. Поддерживаются ETag / Last-Modified
+с ответом 304 на условные запросы и gzip для больших ответов.
+В пакетном запросе недостающие фильмы загружаются параллельно (не больше
+MAX_BATCH_FETCHES за запрос), остальные возвращаются в errors.
+
+Пример:
+    python film_service.py --port 8765 --jobs-db jobs.db
+
+API-ключи передаются так же, как в batch_jobs.py.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from job_queue import JobQueue
+from kinopoisk_api import HEDGE_PERCENTILE, ResponseCache, fetch_film
+
+# Ответы больше этого размера сжимаются gzip, если клиент это поддерживает
+GZIP_MIN_SIZE = 1024
+
+# Максимальное число ID в одном пакетном запросе
+MAX_BATCH_IDS = 100
+
+# Сколько фильмов одного пакетного запроса можно загрузить из API
+# и сколько загрузок выполняется одновременно (на весь сервис)
+MAX_BATCH_FETCHES = 16
+FETCH_WORKERS = 8
+
+# Сколько хранить ETag и время изменения загруженных фильмов, с
+VERSION_TTL = 7 * 24 * 3600
+
+
+class FilmStore:
+    """
+    Read-through хранилище нормализованных фильмов.
+
+    Записи кэша — (payload, last_modified), где last_modified — unix-время.
+    Результаты резервного режима (без unofficial API) не кэшируются,
+    чтобы следующий запрос получил полный каст.
+    Для загруженных из API фильмов last_modified меняется только вместе с ETag,
+    поэтому повторная загрузка тех же данных не ломает If-Modified-Since.
+    """
+
+    def __init__(self, api_key, unofficial_api_key=None, hedge_percentile=None, jobs_db=None):
+        self.api_key = api_key
+        self.unofficial_api_key = unofficial_api_key
+        self.hedge_percentile = hedge_percentile
+        self.jobs_db = jobs_db
+        self._cache = ResponseCache()
+        self._versions = ResponseCache(ttl=VERSION_TTL, max_entries=4096)
+        self._executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+
+    def _stored_result(self, film_id):
+        """Результат из базы пакетной обработки или None (в том числе если база недоступна)"""
+        # Каждый запрос обслуживается в своем потоке, поэтому соединение SQLite — на время чтения
+        try:
+            queue = JobQueue(self.jobs_db, read_only=True)
+        except sqlite3.Error:
+            return None
+        try:
+            return queue.get_result(film_id)
+        except sqlite3.Error:
+            return None
+        finally:
+            queue.close()
+
+    def get(self, film_id):
+        """Возвращает ((payload, last_modified), None) или (None, (status, error))"""
+        entry = self.get_local(film_id)
+        if entry is not None:
+            return entry, None
+        return self.fetch(film_id)
+
+    def get_many(self, film_ids):
+        """
+        Возвращает (entries, errors) для списка ID: entries — {film_id: (payload, last_modified)},
+        errors — {film_id: (status, error)}. Из API загружается не больше MAX_BATCH_FETCHES фильмов.
+        """
+        entries = {}
+        errors = {}
+        missing = []
+        for film_id in film_ids:
+            entry = self.get_local(film_id)
+            if entry is not None:
+                entries[film_id] = entry
+            else:
+                missing.append(film_id)
+        for film_id in missing[MAX_BATCH_FETCHES:]:
+            errors[film_id] = (503, f'Не более {MAX_BATCH_FETCHES} незагруженных фильмов за запрос, повторите запрос')
+        futures = {film_id: self._executor.submit(self.fetch, film_id)
+                   for film_id in missing[:MAX_BATCH_FETCHES]}
+        for film_id, future in futures.items():
+            entry, error = future.result()
+            if error:
+                errors[film_id] = error
+            else:
+                entries[film_id] = entry
+        return entries, errors
+
+    def get_local(self, film_id):
+        """Запись из кэша или базы пакетной обработки без запроса к API, иначе None"""
+        cached = self._cache.get(film_id)
+        if cached is not None:
+            return cached
+
+        if self.jobs_db:
+            stored = self._stored_result(film_id)
+            if stored is not None:
+                result, updated_at = stored
+                entry = ({'id': film_id, **result}, int(updated_at))
+                self._cache.set(film_id, entry)
+                return entry
+        return None
+
+    def fetch(self, film_id):
+        """Загружает фильм из API: ((payload, last_modified), None) или (None, (status, error))"""
+        if not self.api_key:
+            return None, (503, 'Не задан API-ключ kinopoisk.dev')
+        result, error, status = fetch_film(film_id, self.api_key, self.unofficial_api_key, self.hedge_percentile)
+        if error:
+            return None, (404 if status == 404 else 502, error)
+        payload = {'id': film_id, **result}
+        etag = make_etag(encode_payload(payload))
+        version = self._versions.get(film_id)
+        last_modified = version[1] if version is not None and version[0] == etag else int(time.time())
+        self._versions.set(film_id, (etag, last_modified))
+        entry = (payload, last_modified)
+        if not result['degraded']:
+            self._cache.set(film_id, entry)
+        return entry, None
+
+
+def accepts_gzip(accept_encoding):
+    """Разрешает ли заголовок Accept-Encoding gzip (с учетом q=0 и *)"""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    if 'gzip' in qualities:
+        return qualities['gzip'] > 0
+    return qualities.get('*', 0) > 0
+
+
+def encode_payload(payload):
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+
+def make_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def is_not_modified(headers, etag, last_modified):
+    """Проверяет условные заголовки запроса (If-None-Match приоритетнее If-Modified-Since)"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since:
+        try:
+            return int(parsedate_to_datetime(if_modified_since).timestamp()) >= last_modified
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class FilmRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'KinopoiskFilmService/1.0'
+    store = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+
+        if len(parts) == 2 and parts[0] == 'films':
+            if not parts[1].isdigit():
+                return self.send_json_error(400, 'Некорректный ID')
+            entry, error = self.store.get(parts[1])
+            if error:
+                return self.send_json_error(*error)
+            payload, last_modified = entry
+            return self.send_json(payload, last_modified)
+
+        if parts == ['films']:
+            ids = [film_id for value in parse_qs(url.query).get('ids', [])
+                   for film_id in value.split(',') if film_id]
+            if not ids or not all(film_id.isdigit() for film_id in ids):
+                return self.send_json_error(400, 'Укажите числовые ID: /films?ids=1,2,3')
+            if len(ids) > MAX_BATCH_IDS:
+                return self.send_json_error(400, f'Не более {MAX_BATCH_IDS} ID за запрос')
+            ids = list(dict.fromkeys(ids))
+            entries, errors = self.store.get_many(ids)
+            films = [entries[film_id][0] for film_id in ids if film_id in entries]
+            last_modified = max((entry[1] for entry in entries.values()), default=0)
+            errors = {film_id: errors[film_id][1] for film_id in ids if film_id in errors}
+            return self.send_json({'films': films, 'errors': errors}, last_modified or int(time.time()))
+
+        self.send_json_error(404, 'Неизвестный путь')
+
+    def send_json(self, payload, last_modified):
+        body = encode_payload(payload)
+        etag = make_etag(body)
+        if is_not_modified(self.headers, etag, last_modified):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(last_modified, usegmt=True))
+            self.end_headers()
+            return
+        self.send_body(200, body, etag=etag, last_modified=last_modified)
+
+    def send_json_error(self, status, message):
+        body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+        self.send_body(status, body)
+
+    def send_body(self, status, body, etag=None, last_modified=None):
+        gzipped = len(body) >= GZIP_MIN_SIZE and accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        if gzipped:
+            body = gzip.compress(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(last_modified, usegmt=True))
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(store, host='127.0.0.1', port=8765):
+    handler = type('BoundFilmRequestHandler', (FilmRequestHandler,), {'store': store})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный HTTP-сервис данных о фильмах")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--api-key', default=os.environ.get('KINOPOISK_API_KEY'))
+    parser.add_argument('--unofficial-api-key', default=os.environ.get('KINOPOISK_UNOFFICIAL_API_KEY'))
+    parser.add_argument('--hedge', action='store_true', help="Хеджированные запросы к unofficial API")
+    parser.add_argument('--jobs-db', help="База batch_jobs.py с уже загруженными фильмами")
+    args = parser.parse_args(argv)
+
+    store = FilmStore(args.api_key, args.unofficial_api_key,
+                      HEDGE_PERCENTILE if args.hedge else None, args.jobs_db)
+    server = make_server(store, args.host, args.port)
+    print(f"Сервис запущен: http://{args.host}:{args.port}/films/{{id}}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
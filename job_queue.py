@@ -0,0 +1,252 @@
+"""
+Локальная очередь задач пакетной обработки на SQLite.
+
+Каждый ID фильма — отдельная задача с состоянием (pending / in_progress / done / failed),
+числом попыток и арендой (lease). Несколько процессов могут одновременно забирать задачи
+из одной базы: захват выполняется в транзакции BEGIN IMMEDIATE, а задачи упавших
+воркеров возвращаются в работу по истечении аренды. Результаты, полученные в резервном
+режиме (каст без unofficial API), помечаются degraded и могут быть поставлены в очередь заново:
+на время обновления и после его неудачи задача сохраняет прежний результат.
+
+База открывается в режиме журнала по умолчанию (не WAL), чтобы ее можно было
+разместить на общей файловой системе.
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+
+STATE_PENDING = 'pending'
+STATE_IN_PROGRESS = 'in_progress'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    film_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    result TEXT,
+    degraded INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+def default_worker_id():
+    """Идентификатор воркера: хост и PID процесса"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """Очередь ID фильмов в файле SQLite"""
+
+    def __init__(self, path, lease_seconds=120, max_attempts=3, read_only=False):
+        """
+        read_only — открыть существующую базу только для чтения: файл не создается,
+        схема не меняется (sqlite3.OperationalError, если базы нет)
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # isolation_level=None — транзакциями управляем явно
+        if read_only:
+            uri = Path(path).absolute().as_uri() + '?mode=ro'
+            self._conn = sqlite3.connect(uri, uri=True, timeout=30, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            return
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        # Базы, созданные до появления колонки degraded
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'degraded' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN degraded INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def enqueue(self, film_ids):
+        """Добавляет ID в очередь. Уже существующие задачи не меняются. Возвращает число новых"""
+        now = time.time()
+        with self._transaction():
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (film_id, state, updated_at) VALUES (?, ?, ?)",
+                [(str(film_id), STATE_PENDING, now) for film_id in film_ids],
+            )
+            return self._conn.total_changes - before
+
+    def claim(self, worker_id):
+        """
+        Забирает следующую задачу: ожидающую или с истекшей арендой.
+        Возвращает ID фильма или None, если задач не осталось.
+        """
+        now = time.time()
+        with self._transaction():
+            # Задачи с истекшей арендой, исчерпавшие попытки, считаем неудачными
+            # (а обновлявшиеся — снова выполненными с прежним результатом)
+            self._conn.execute(
+                "UPDATE jobs SET state = CASE WHEN result IS NULL THEN ? ELSE ? END, "
+                "worker = NULL, lease_expires = NULL, "
+                "last_error = COALESCE(last_error, 'Истекла аренда'), updated_at = ? "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (STATE_FAILED, STATE_DONE, now, STATE_IN_PROGRESS, now, self.max_attempts),
+            )
+            row = self._conn.execute(
+                "SELECT film_id FROM jobs "
+                "WHERE state = ? OR (state = ? AND lease_expires < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (STATE_PENDING, STATE_IN_PROGRESS, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE film_id = ?",
+                (STATE_IN_PROGRESS, worker_id, now + self.lease_seconds, now, row['film_id']),
+            )
+            return row['film_id']
+
+    def complete(self, film_id, worker_id, result, degraded=False):
+        """
+        Сохраняет результат задачи. degraded — результат получен в резервном режиме.
+        Возвращает False, если аренда уже перешла к другому воркеру и результат отброшен.
+        """
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, degraded = ?, last_error = NULL, worker = NULL, "
+                "lease_expires = NULL, updated_at = ? "
+                "WHERE film_id = ? AND worker = ? AND state = ?",
+                (STATE_DONE, json.dumps(result, ensure_ascii=False), int(degraded), time.time(),
+                 str(film_id), worker_id, STATE_IN_PROGRESS),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, film_id, worker_id, error):
+        """
+        Отмечает неудачную попытку: задача вернется в очередь, пока не исчерпаны попытки.
+        Обновлявшаяся задача после исчерпания попыток снова выполнена с прежним результатом.
+        """
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts < ? THEN ? "
+                "WHEN result IS NULL THEN ? ELSE ? END, "
+                "last_error = ?, worker = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE film_id = ? AND worker = ? AND state = ?",
+                (self.max_attempts, STATE_PENDING, STATE_FAILED, STATE_DONE, str(error), time.time(),
+                 str(film_id), worker_id, STATE_IN_PROGRESS),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, film_id, worker_id):
+        """Возвращает задачу в очередь без учета попытки (например, при остановке воркера)"""
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), worker = NULL, "
+                "lease_expires = NULL, updated_at = ? "
+                "WHERE film_id = ? AND worker = ? AND state = ?",
+                (STATE_PENDING, time.time(), str(film_id), worker_id, STATE_IN_PROGRESS),
+            )
+
+    def retry_failed(self):
+        """Возвращает все неудачные задачи в очередь со сбросом попыток"""
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, updated_at = ? WHERE state = ?",
+                (STATE_PENDING, time.time(), STATE_FAILED),
+            )
+            return cursor.rowcount
+
+    def requeue_degraded(self):
+        """
+        Возвращает в очередь выполненные в резервном режиме задачи со сбросом попыток.
+        Прежний результат сохраняется до получения нового. Возвращает число таких задач.
+        """
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, updated_at = ? WHERE state = ? AND degraded = 1",
+                (STATE_PENDING, time.time(), STATE_DONE),
+            )
+            return cursor.rowcount
+
+    def degraded_count(self):
+        """Число сохраненных результатов резервного режима (в том числе на обновлении)"""
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE result IS NOT NULL AND degraded = 1"
+        ).fetchone()[0]
+
+    def stats(self):
+        """Количество задач по состояниям"""
+        counts = {state: 0 for state in (STATE_PENDING, STATE_IN_PROGRESS, STATE_DONE, STATE_FAILED)}
+        for row in self._conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+            counts[row['state']] = row['n']
+        return counts
+
+    def failed(self):
+        """Список (film_id, attempts, last_error) неудачных задач"""
+        rows = self._conn.execute(
+            "SELECT film_id, attempts, last_error FROM jobs WHERE state = ? ORDER BY rowid",
+            (STATE_FAILED,),
+        )
+        return [(row['film_id'], row['attempts'], row['last_error']) for row in rows]
+
+    def get_result(self, film_id):
+        """
+        Полный (не резервного режима) результат выполненной задачи
+        и время его сохранения (unix) или None
+        """
+        row = self._conn.execute(
+            "SELECT result, updated_at FROM jobs WHERE film_id = ? AND state = ? AND degraded = 0",
+            (str(film_id), STATE_DONE),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row['result']), row['updated_at']
+
+    def stored(self, film_id):
+        """Сохраненный результат задачи в любом состоянии: (result, degraded) или None"""
+        row = self._conn.execute(
+            "SELECT result, degraded FROM jobs WHERE film_id = ? AND result IS NOT NULL", (str(film_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row['result']), bool(row['degraded'])
+
+    def completed(self):
+        """
+        Итератор (film_id, result, degraded) по задачам с результатом в порядке добавления,
+        включая выполненные в резервном режиме и поставленные на обновление
+        """
+        rows = self._conn.execute(
+            "SELECT film_id, result, degraded FROM jobs WHERE result IS NOT NULL ORDER BY rowid"
+        )
+        for row in rows:
+            yield row['film_id'], json.loads(row['result']), bool(row['degraded'])
+
+
+class _Transaction:
+    """Транзакция с немедленной блокировкой на запись (BEGIN IMMEDIATE)"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.execute("COMMIT")
+        else:
+            self._conn.execute("ROLLBACK")
+        return False
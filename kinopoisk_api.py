@@ -0,0 +1,499 @@
+"""
+Работа с API kinopoisk.dev и kinopoiskapiunofficial.tech: запросы и нормализация данных о фильме.
+
+Модуль не зависит от Streamlit и используется как интерфейсом, так и пакетной обработкой.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resilience import guarded_get, get_breaker, is_failure_status, STATE_HALF_OPEN, STATE_OPEN
+
+# API URLs
+API_URL = 'https://api.kinopoisk.dev/v1.4/movie/{}'
+API_URL_STAFF = 'https://api.kinopoisk.dev/v1.4/person/search?query={}'
+API_URL_REVIEWS = 'https://api.kinopoisk.dev/v1.4/review?movieId={}'
+
+# Unofficial API для каста
+UNOFFICIAL_API_STAFF = 'https://kinopoiskapiunofficial.tech/api/v1/staff'
+
+# Перцентиль задержек, после которого отправляется хеджированный запрос
+HEDGE_PERCENTILE = 95
+
+# Время жизни кэша успешных ответов API, с
+CACHE_TTL = 3600
+
+
+class ResponseCache:
+    """Потокобезопасный LRU-кэш с ограничением времени жизни записей"""
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Общие для процесса кэши ответов: фильмы kinopoisk.dev и staff unofficial API
+film_cache = ResponseCache()
+staff_cache = ResponseCache()
+
+def cache_key(film_id, api_key):
+    """
+    Ключ кэша: ID фильма и хэш API-ключа. Сессия с неверным или просроченным
+    ключом не получает данные, загруженные с другим ключом, и видит ошибку авторизации.
+    """
+    key_hash = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+    return f"{film_id}:{key_hash}"
+
+_http_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """Общая для процесса HTTP-сессия: соединения переиспользуются между запросами"""
+    global _http_session
+    with _session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+def get_headers(api_key):
+    return {
+        'X-API-KEY': api_key,
+        'Content-Type': 'application/json',
+    }
+
+def get_unofficial_headers(api_key):
+    return {
+        'X-API-KEY': api_key,
+        'Content-Type': 'application/json',
+    }
+
+def format_money(value):
+    if not value or value == '-' or value is None:
+        return '-'
+    
+    if isinstance(value, dict):
+        # Новый формат API - объект с валютой
+        amount = value.get('value', 0)
+        currency = value.get('currency', 'USD')
+        if amount and amount > 0:
+            formatted = f"{amount:,}".replace(",", " ")
+            return f"{formatted} {currency}"
+        return '-'
+    
+    # Обработка старого формата
+    parts = str(value).split()
+    if not parts or not parts[0].replace(',', '').replace(' ', '').isdigit():
+        return value
+    try:
+        num = int(parts[0].replace(' ', '').replace(',', ''))
+        currency = parts[1] if len(parts) > 1 and parts[1] else 'USD'
+        formatted = f"{num:,}".replace(",", " ")
+        return f"{formatted} {currency}".strip()
+    except Exception:
+        return value
+
+def format_date(date_str):
+    if not date_str or date_str == '-':
+        return '-'
+    try:
+        dt = datetime.strptime(date_str[:10], '%Y-%m-%d')
+        return dt.strftime('%d.%m.%Y')
+    except Exception:
+        return date_str
+
+def format_duration(duration):
+    """Форматирует продолжительность в минутах"""
+    if not duration or duration == '-' or duration is None:
+        return '-'
+    try:
+        minutes = int(duration)
+        if minutes <= 0:
+            return '-'
+        return str(minutes)
+    except (ValueError, TypeError):
+        return str(duration) if duration else '-'
+
+def format_vote_count(vote_count):
+    """Форматирует количество голосов"""
+    if not vote_count or vote_count == '-' or vote_count is None:
+        return '-'
+    try:
+        count = int(vote_count)
+        if count <= 0:
+            return '-'
+        # Форматируем с разделителями тысяч
+        return f"{count:,}".replace(",", " ")
+    except (ValueError, TypeError):
+        return str(vote_count) if vote_count else '-'
+
+def get_film_info(film_id, api_key):
+    """
+    Возвращает (data, error, status): status — HTTP-код ответа kinopoisk.dev
+    или None, если ответа не было
+    """
+    key = cache_key(film_id, api_key)
+    cached = film_cache.get(key)
+    if cached is not None:
+        return cached, None, 200
+    url = API_URL.format(film_id)
+    try:
+        response = get_http_session().get(url, headers=get_headers(api_key), timeout=10)
+        if response.status_code == 404:
+            return None, f'Фильм с ID {film_id} не найден', 404
+        if response.status_code != 200:
+            return None, f'Ошибка: {response.status_code} — {response.text}', response.status_code
+        data = response.json()
+        film_cache.set(key, data)
+        return data, None, 200
+    except Exception as e:
+        return None, f'Ошибка запроса: {e}', None
+
+def get_staff_from_unofficial_api(film_id, api_key, hedge_percentile=None):
+    """
+    Получает данные о съемочной группе из unofficial API (через circuit breaker).
+    Возвращает (staff_data, error, status): status — HTTP-код ответа или None,
+    если ответа не было (circuit breaker открыт или ошибка соединения).
+    """
+    key = cache_key(film_id, api_key)
+    cached = staff_cache.get(key)
+    if cached is not None:
+        return cached, None, 200
+    try:
+        url = f"{UNOFFICIAL_API_STAFF}?filmId={film_id}"
+        response, error = guarded_get(UNOFFICIAL_API_STAFF, url, get_unofficial_headers(api_key),
+                                      timeout=10, hedge_percentile=hedge_percentile,
+                                      session=get_http_session())
+        if error:
+            return [], f'Ошибка при получении данных о съемочной группе: {error}', None
+        
+        if response.status_code == 404:
+            return [], f'Данные о съемочной группе для фильма {film_id} не найдены', 404
+        if response.status_code != 200:
+            return [], f'Ошибка получения данных о съемочной группе: {response.status_code}', response.status_code
+        
+        staff_data = response.json()
+        staff_cache.set(key, staff_data)
+        return staff_data, None, 200
+        
+    except Exception as e:
+        return [], f'Ошибка при получении данных о съемочной группе: {e}', None
+
+# Профессии каста в порядке вывода: ключ и название
+CAST_PROFESSIONS = [
+    ("director", "Режиссер"),
+    ("actor", "Актеры"),
+    ("producer", "Продюсеры"),
+    ("voice_actor", "Актеры дубляжа"),
+    ("writer", "Сценаристы"),
+    ("operator", "Оператор"),
+    ("composer", "Композитор"),
+]
+
+def empty_cast_groups():
+    """Пустой каст, сгруппированный по профессиям (в порядке CAST_PROFESSIONS)"""
+    return {key: [] for key, _ in CAST_PROFESSIONS}
+
+def flatten_cast(cast_groups, professions=None):
+    """
+    Разворачивает сгруппированный каст в список пар (название профессии, "имя;id")
+    в порядке CAST_PROFESSIONS.
+    professions — ключи профессий, которые нужно оставить (по умолчанию все).
+    """
+    cast = []
+    for key, label in CAST_PROFESSIONS:
+        if professions is None or key in professions:
+            cast.extend((label, line) for line in cast_groups.get(key, []))
+    return cast
+
+def build_cast_page(cast_groups, professions, name_prefix, page, page_size):
+    """
+    Строит одну страницу каста с учетом фильтров: профессии и начало имени.
+    Возвращает (строки страницы {'Профессия', 'Имя', 'ID'}, число записей после фильтрации).
+    page_size=0 — только подсчет записей.
+    """
+    prefix = name_prefix.strip().lower()
+    start = page * page_size
+    end = start + page_size
+    rows = []
+    total = 0
+    for key, label in CAST_PROFESSIONS:
+        if key not in professions:
+            continue
+        lines = cast_groups.get(key, [])
+        if prefix:
+            lines = [line for line in lines if line.lower().lstrip().startswith(prefix)]
+        # Материализуем только записи, попадающие на текущую страницу
+        if total < end and total + len(lines) > start:
+            for line in lines[max(0, start - total):end - total]:
+                name, _, staff_id = line.partition(';')
+                rows.append({'Профессия': label, 'Имя': name.strip(), 'ID': staff_id.strip()})
+        total += len(lines)
+    return rows, total
+
+def group_unofficial_staff_data(staff_data):
+    """
+    Группирует данные о съемочной группе из unofficial API по профессиям.
+    Актеры дубляжа в unofficial API не запрашиваются — их группа остается пустой.
+    """
+    result = empty_cast_groups()
+    for person in staff_data:
+        profession_key = (person.get('professionKey') or '').lower()
+        if profession_key in result and profession_key != 'voice_actor':
+            name_ru = (person.get('nameRu') or '').strip()
+            name_en = (person.get('nameEn') or '').strip()
+            name = name_ru if name_ru else name_en
+            if not name:
+                continue
+            staff_id = person.get('staffId')
+            if staff_id:
+                result[profession_key].append(f"{name};{staff_id}")
+            else:
+                result[profession_key].append(name)
+    return result
+
+def group_dev_persons(persons, professions=None):
+    """
+    Группирует поле persons из kinopoisk.dev по профессиям.
+    professions — ключи профессий, которые нужно взять (по умолчанию все).
+    """
+    result = empty_cast_groups()
+    for person in persons:
+        profession_key = (person.get('enProfession') or '').lower()
+        if (person.get('profession') or '').strip().lower() == 'актеры дубляжа':
+            profession_key = 'voice_actor'
+        if profession_key not in result:
+            continue
+        if professions is not None and profession_key not in professions:
+            continue
+        name = (person.get('name') or person.get('enName') or '').strip()
+        if not name:
+            continue
+        person_id = person.get('id')
+        if person_id:
+            result[profession_key].append(f"{name};{person_id}")
+        else:
+            result[profession_key].append(name)
+    return result
+
+def get_film_cast(data, film_id, unofficial_api_key, hedge_percentile=None):
+    """
+    Извлекает информацию о съемочной группе, сгруппированную по профессиям
+    (словарь ключ профессии -> список "имя;id" в порядке CAST_PROFESSIONS).
+    Возвращает (cast_groups, data_source, degraded), где degraded — признак резервного режима:
+    - режиссер, актеры, продюсеры, сценаристы, оператор, композитор — из unofficial API
+    - актеры дубляжа — только из основного API (kinopoisk.dev)
+    Если unofficial API недоступен (открытый circuit breaker, ошибка соединения,
+    5xx, 429 или 402), весь каст берется из persons kinopoisk.dev, о чем сообщается
+    в источнике данных. Прочие ответы 4xx (нет данных, неверный ключ) резервный
+    режим не включают.
+    """
+    data_source = []
+    persons = data.get('persons', [])
+
+    # 1. Получаем staff из unofficial API (один запрос на фильм)
+    if unofficial_api_key:
+        staff_data, error, status = get_staff_from_unofficial_api(film_id, unofficial_api_key, hedge_percentile)
+        if not error:
+            cast_groups = group_unofficial_staff_data(staff_data)
+            data_source.append("Unofficial API: режиссер, актеры, продюсеры, сценаристы, оператор, композитор")
+        elif status is not None and not is_failure_status(status):
+            # Сервис ответил: данных нет или ключ не принят
+            cast_groups = empty_cast_groups()
+            if status == 404:
+                data_source.append("Unofficial API: нет данных о съемочной группе")
+            elif status in (401, 403):
+                data_source.append(f"Unofficial API: ключ не принят ({status})")
+            else:
+                data_source.append(f"Unofficial API: ошибка {status}")
+        else:
+            # Резервный режим: весь каст из kinopoisk.dev
+            breaker = get_breaker(UNOFFICIAL_API_STAFF)
+            breaker_state = breaker.state
+            if breaker_state == STATE_OPEN:
+                reason = f"unofficial API отключен, повтор через {breaker.retry_after()} с"
+            elif breaker_state == STATE_HALF_OPEN and status is None:
+                # Другой запрос уже проверяет, восстановился ли сервис
+                reason = "unofficial API проверяется после сбоя"
+            elif status is not None:
+                reason = f"unofficial API вернул ошибку {status}"
+            else:
+                reason = "unofficial API не ответил"
+            cast_groups = group_dev_persons(persons)
+            source = f"kinopoisk.dev (резервный режим: {reason}): режиссер, актеры, продюсеры, актеры дубляжа, сценаристы, оператор, композитор"
+            has_cast = any(cast_groups.values())
+            return cast_groups, source if has_cast else f"Нет данных о касте ({reason})", True
+    else:
+        cast_groups = empty_cast_groups()
+
+    # 2. Получаем только актеров дубляжа из основного API
+    cast_groups['voice_actor'] = group_dev_persons(persons, professions={'voice_actor'})['voice_actor']
+    if cast_groups['voice_actor']:
+        data_source.append("kinopoisk.dev: актеры дубляжа")
+
+    return cast_groups, ", ".join(data_source) if data_source else "Нет данных о касте", False
+
+def get_film_boxoffice(data):
+    """Извлекает информацию о кассовых сборах из данных фильма"""
+    result = {}
+    
+    # В новом API информация о бюджете может быть в budget
+    budget = data.get('budget')
+    if budget:
+        result['budget'] = format_money(budget)
+    
+    # Информация о сборах может быть в fees
+    fees = data.get('fees', {})
+    if fees:
+        if 'world' in fees:
+            result['world'] = format_money(fees['world'])
+        if 'russia' in fees:
+            result['russia'] = format_money(fees['russia'])
+        if 'usa' in fees:
+            result['usa'] = format_money(fees['usa'])
+    
+    return result
+
+def get_film_premieres(data):
+    """Извлекает информацию о премьерах из данных фильма"""
+    premiere_rf = '-'
+    premiere_world = '-'
+    
+    # Информация о премьерах в новом API
+    premiere = data.get('premiere')
+    if premiere:
+        # Премьера в России
+        if premiere.get('russia'):
+            premiere_rf = format_date(premiere['russia'])
+        
+        # Мировая премьера
+        if premiere.get('world'):
+            premiere_world = format_date(premiere['world'])
+    
+    return premiere_rf, premiere_world
+
+def safe(val):
+    return '-' if val is None or val == '' else val
+
+def build_film_info(data):
+    """Собирает основную информацию о фильме из ответа kinopoisk.dev"""
+    # Извлекаем рейтинги
+    rating_kp = '-'
+    rating_imdb = '-'
+    votes_kp = '-'
+
+    if 'rating' in data:
+        rating_data = data['rating']
+        # Округляем рейтинг КП до одного знака после запятой
+        kp_rating = rating_data.get('kp')
+        if kp_rating and kp_rating != '-' and kp_rating is not None:
+            try:
+                rating_kp = str(round(float(kp_rating), 1))
+            except (ValueError, TypeError):
+                rating_kp = safe(kp_rating)
+        else:
+            rating_kp = '-'
+
+        rating_imdb = safe(rating_data.get('imdb'))
+
+    # Извлекаем количество голосов из votes.kp
+    if 'votes' in data:
+        votes_data = data['votes']
+        votes_kp = format_vote_count(votes_data.get('kp'))
+
+    # Извлекаем жанры
+    genres = []
+    if 'genres' in data:
+        for genre in data['genres']:
+            if isinstance(genre, dict) and 'name' in genre:
+                genres.append(genre['name'])
+            elif isinstance(genre, str):
+                genres.append(genre)
+
+    # Извлекаем страны
+    countries = []
+    if 'countries' in data:
+        for country in data['countries']:
+            if isinstance(country, dict) and 'name' in country:
+                countries.append(country['name'])
+            elif isinstance(country, str):
+                countries.append(country)
+
+    # Основная информация
+    film_info = {
+        'Название (RU)': safe(data.get('name')),
+        'Оригинальное название': safe(data.get('alternativeName') or data.get('enName')),
+        'Год': safe(data.get('year')),
+        'Жанры': safe(', '.join(genres) if genres else '-'),
+        'Страна': safe(', '.join(countries) if countries else '-'),
+        'Рейтинг IMDB': safe(rating_imdb),
+        'Рейтинг Кинопоиска': safe(rating_kp),
+        'Кол-во оценок КП': safe(votes_kp),
+        'Описание': safe(data.get('description')),
+        'Продолжительность (мин)': format_duration(data.get('movieLength'))
+    }
+
+    # Касса
+    boxoffice = get_film_boxoffice(data)
+    film_info.update({
+        'Бюджет': boxoffice.get('budget', '-'),
+        'Сборы в мире': boxoffice.get('world', '-'),
+        'Сборы в России': boxoffice.get('russia', '-'),
+        'Сборы в США': boxoffice.get('usa', '-')
+    })
+
+    # Премьеры
+    premiere_rf, premiere_world = get_film_premieres(data)
+    film_info.update({
+        'Премьера в России': safe(premiere_rf),
+        'Премьера в мире': safe(premiere_world)
+    })
+    
+    return film_info
+
+def fetch_film(film_id, api_key, unofficial_api_key=None, hedge_percentile=None):
+    """
+    Загружает и нормализует фильм: основная информация, каст по профессиям, источник каста
+    и признак резервного режима (degraded).
+    Возвращает (result, error, status), где status — HTTP-код ответа kinopoisk.dev или None
+    """
+    data, error, status = get_film_info(film_id, api_key)
+    if error or not data:
+        return None, error or 'Нет данных', status
+    film_info = build_film_info(data)
+    cast_groups, data_source, degraded = get_film_cast(data, film_id, unofficial_api_key, hedge_percentile)
+    return {'film_info': film_info, 'cast': cast_groups, 'data_source': data_source,
+            'degraded': degraded}, None, status
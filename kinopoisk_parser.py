@@ -1,10 +1,23 @@
 import streamlit as st
 import pandas as pd
-import requests
-import json
-from datetime import datetime, timezone
 import io
 import re
+import time
+from contextlib import contextmanager
+
+from kinopoisk_api import (
+    CAST_PROFESSIONS,
+    HEDGE_PERCENTILE,
+    build_cast_page,
+    empty_cast_groups,
+    fetch_film,
+    flatten_cast,
+)
+
+RUN_STARTED = time.perf_counter()
+
+# Варианты размера страницы таблицы каста
+CAST_PAGE_SIZES = [50, 100, 500]
 
 # Настройка страницы
 st.set_page_config(
@@ -13,286 +26,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# API URLs
-API_URL = 'https://api.kinopoisk.dev/v1.4/movie/{}'
-API_URL_STAFF = 'https://api.kinopoisk.dev/v1.4/person/search?query={}'
-API_URL_REVIEWS = 'https://api.kinopoisk.dev/v1.4/review?movieId={}'
-
-# Unofficial API для каста
-UNOFFICIAL_API_STAFF = 'https://kinopoiskapiunofficial.tech/api/v1/staff'
-
-def get_headers(api_key):
-    return {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json',
-    }
-
-def get_unofficial_headers(api_key):
-    return {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json',
-    }
-
-def format_money(value):
-    if not value or value == '-' or value is None:
-        return '-'
-    
-    if isinstance(value, dict):
-        # Новый формат API - объект с валютой
-        amount = value.get('value', 0)
-        currency = value.get('currency', 'USD')
-        if amount and amount > 0:
-            formatted = f"{amount:,}".replace(",", " ")
-            return f"{formatted} {currency}"
-        return '-'
-    
-    # Обработка старого формата
-    parts = str(value).split()
-    if not parts or not parts[0].replace(',', '').replace(' ', '').isdigit():
-        return value
-    try:
-        num = int(parts[0].replace(' ', '').replace(',', ''))
-        currency = parts[1] if len(parts) > 1 and parts[1] else 'USD'
-        formatted = f"{num:,}".replace(",", " ")
-        return f"{formatted} {currency}".strip()
-    except Exception as e:
-        return value
-
-def format_date(date_str):
-    if not date_str or date_str == '-':
-        return '-'
-    try:
-        dt = datetime.strptime(date_str[:10], '%Y-%m-%d')
-        return dt.strftime('%d.%m.%Y')
-    except Exception as e:
-        return date_str
-
-def format_duration(duration):
-    """Форматирует продолжительность в минутах"""
-    if not duration or duration == '-' or duration is None:
-        return '-'
-    try:
-        minutes = int(duration)
-        if minutes <= 0:
-            return '-'
-        return str(minutes)
-    except (ValueError, TypeError):
-        return str(duration) if duration else '-'
-
-def format_vote_count(vote_count):
-    """Форматирует количество голосов"""
-    if not vote_count or vote_count == '-' or vote_count is None:
-        return '-'
-    try:
-        count = int(vote_count)
-        if count <= 0:
-            return '-'
-        # Форматируем с разделителями тысяч
-        return f"{count:,}".replace(",", " ")
-    except (ValueError, TypeError):
-        return str(vote_count) if vote_count else '-'
-
-def get_film_info(film_id, api_key):
-    url = API_URL.format(film_id)
-    try:
-        response = requests.get(url, headers=get_headers(api_key), timeout=10)
-        if response.status_code == 404:
-            return None, f'Фильм с ID {film_id} не найден'
-        if response.status_code != 200:
-            return None, f'Ошибка: {response.status_code} — {response.text}'
-        return response.json(), None
-    except Exception as e:
-        return None, f'Ошибка запроса: {e}'
-
-def get_staff_from_unofficial_api(film_id, api_key):
-    """Получает данные о съемочной группе из unofficial API"""
-    try:
-        url = f"{UNOFFICIAL_API_STAFF}?filmId={film_id}"
-        response = requests.get(url, headers=get_unofficial_headers(api_key), timeout=10)
-        
-        if response.status_code == 404:
-            return [], f'Данные о съемочной группе для фильма {film_id} не найдены'
-        if response.status_code != 200:
-            return [], f'Ошибка получения данных о съемочной группе: {response.status_code}'
-        
-        staff_data = response.json()
-        return staff_data, None
-        
-    except Exception as e:
-        return [], f'Ошибка при получении данных о съемочной группе: {e}'
-
-def process_unofficial_staff_data(staff_data):
-    """Обрабатывает данные о съемочной группе из unofficial API"""
-    cast = []
-    
-    # Исключаемые профессии
-    excluded_professions = [
-        'монтажер', 'художник', 'editor', 'artist', 
-        'монтажёр', 'звукорежиссёр', 'звукооператор',
-        'costume designer', 'art director', 'set decorator',
-        'EDITOR', 'DESIGN', 'PRODUCER_USSR'  # Добавляем ключи профессий
-    ]
-    
-    for person in staff_data:
-        # Получаем ключ профессии
-        profession_key = person.get('professionKey', '').upper()
-        profession_text = person.get('professionText', '').lower()
-        
-        # Проверяем исключения
-        if profession_key in excluded_professions:
-            continue
-        if any(x in profession_text for x in excluded_professions):
-            continue
-        
-        # Получаем имя (приоритет русскому)
-        name_ru = person.get('nameRu', '').strip()
-        name_en = person.get('nameEn', '').strip()
-        name = name_ru if name_ru else name_en
-        
-        if not name:
-            continue
-        
-        # Получаем ID
-        staff_id = person.get('staffId')
-        
-        # Добавляем в список
-        if staff_id:
-            cast.append(f"{name};{staff_id}")
-        else:
-            cast.append(name)
-    
-    return cast
-
-def process_unofficial_staff_data_by_professions(staff_data):
-    """
-    Обрабатывает данные о съемочной группе из unofficial API,
-    возвращая только нужные профессии в нужном порядке.
-    Порядок: Режиссер, Актеры, Продюсеры, Сценаристы, Оператор, Композитор
-    """
-    # Ключи профессий в нужном порядке
-    profession_order = [
-        ("director", "Режиссер"),
-        ("actor", "Актеры"),
-        ("producer", "Продюсеры"),
-        ("writer", "Сценаристы"),
-        ("operator", "Оператор"),
-        ("composer", "Композитор"),
-    ]
-    # Собираем по ключу
-    result = {key: [] for key, _ in profession_order}
-    for person in staff_data:
-        profession_key = (person.get('professionKey') or '').lower()
-        if profession_key in result:
-            name_ru = (person.get('nameRu') or '').strip()
-            name_en = (person.get('nameEn') or '').strip()
-            name = name_ru if name_ru else name_en
-            if not name:
-                continue
-            staff_id = person.get('staffId')
-            if staff_id:
-                result[profession_key].append(f"{name};{staff_id}")
-            else:
-                result[profession_key].append(name)
-    # Собираем итоговый список в нужном порядке
-    ordered_cast = []
-    for key, _ in profession_order:
-        ordered_cast.extend(result[key])
-    return ordered_cast
-
-
-def get_film_cast(data, film_id, unofficial_api_key):
-    """
-    Извлекает информацию о съемочной группе:
-    - режиссер, актеры, продюсеры, сценаристы, оператор, композитор — из unofficial API
-    - актеры дубляжа — только из основного API (kinopoisk.dev)
-    Итоговый список: режиссер, актеры, продюсеры, актеры дубляжа, сценаристы, оператор, композитор
-    """
-    cast_director_actor_producer_writer_operator_composer = []
-    cast_voice_actors = []
-    data_source = []
-
-    # 1. Получаем staff из unofficial API
-    if unofficial_api_key:
-        staff_data, error = get_staff_from_unofficial_api(film_id, unofficial_api_key)
-        if staff_data and not error:
-            cast_director_actor_producer_writer_operator_composer = process_unofficial_staff_data_by_professions(staff_data)
-            data_source.append("Unofficial API: режиссер, актеры, продюсеры, сценаристы, оператор, композитор")
-
-    # 2. Получаем только актеров дубляжа из основного API
-    persons = data.get('persons', [])
-    for person in persons:
-        profession_ru = (person.get('profession') or '').strip().lower()
-        if profession_ru == 'актеры дубляжа':
-            name = person.get('name') or person.get('enName') or '-'
-            person_id = person.get('id')
-            if person_id:
-                cast_voice_actors.append(f"{name};{person_id}")
-            else:
-                cast_voice_actors.append(name)
-    if cast_voice_actors:
-        data_source.append("kinopoisk.dev: актеры дубляжа")
-
-    # 3. Собираем итоговый список в нужном порядке
-    # Порядок: режиссер, актеры, продюсеры, актеры дубляжа, сценаристы, оператор, композитор
-    # В cast_director_actor_producer_writer_operator_composer уже нужный порядок, просто вставляем актеров дубляжа после продюсеров
-    # Определяем индексы для вставки
-    profession_order = ["director", "actor", "producer", "writer", "operator", "composer"]
-    # Считаем, сколько персон в первых трёх категориях (режиссер, актеры, продюсеры)
-    staff_data = []
-    if unofficial_api_key:
-        staff_data, _ = get_staff_from_unofficial_api(film_id, unofficial_api_key)
-    counts = {k: 0 for k in profession_order}
-    for person in (staff_data or []):
-        profession_key = (person.get('professionKey') or '').lower()
-        if profession_key in counts:
-            counts[profession_key] += 1
-    insert_index = counts["director"] + counts["actor"] + counts["producer"]
-    # Вставляем актеров дубляжа после продюсеров
-    cast = (
-        cast_director_actor_producer_writer_operator_composer[:insert_index]
-        + cast_voice_actors
-        + cast_director_actor_producer_writer_operator_composer[insert_index:]
-    )
-    return cast, ", ".join(data_source) if data_source else "Нет данных о касте"
-
-def get_film_boxoffice(data):
-    """Извлекает информацию о кассовых сборах из данных фильма"""
-    result = {}
-    
-    # В новом API информация о бюджете может быть в budget
-    budget = data.get('budget')
-    if budget:
-        result['budget'] = format_money(budget)
-    
-    # Информация о сборах может быть в fees
-    fees = data.get('fees', {})
-    if fees:
-        if 'world' in fees:
-            result['world'] = format_money(fees['world'])
-        if 'russia' in fees:
-            result['russia'] = format_money(fees['russia'])
-        if 'usa' in fees:
-            result['usa'] = format_money(fees['usa'])
-    
-    return result
-
-def get_film_premieres(data):
-    """Извлекает информацию о премьерах из данных фильма"""
-    premiere_rf = '-'
-    premiere_world = '-'
-    
-    # Информация о премьерах в новом API
-    premiere = data.get('premiere')
-    if premiere:
-        # Премьера в России
-        if premiere.get('russia'):
-            premiere_rf = format_date(premiere['russia'])
-        
-        # Мировая премьера
-        if premiere.get('world'):
-            premiere_world = format_date(premiere['world'])
-    
-    return premiere_rf, premiere_world
+# Режим отладки: время отрисовки показывается при открытии страницы с ?debug=1
+DEBUG_TIMINGS = st.query_params.get("debug") == "1"
 
 def create_excel_file(film_data, cast_data):
     """Создает Excel файл с данными о фильме"""
@@ -317,19 +52,19 @@ def create_excel_file(film_data, cast_data):
         
         # Данные о касте
         cast_list = []
-        for line in cast_data:
+        for profession, line in cast_data:
             if ';' in line:
                 name, staff_id = line.split(';', 1)
                 # Очищаем имя от проблемных символов
                 clean_name = name.strip().replace('\x00', '').replace('\ufeff', '')
                 if len(clean_name) > 255:  # Ограничение для имен
                     clean_name = clean_name[:255]
-                cast_list.append({'Имя': clean_name, 'ID': staff_id.strip()})
+                cast_list.append({'Профессия': profession, 'Имя': clean_name, 'ID': staff_id.strip()})
             else:
                 clean_name = line.strip().replace('\x00', '').replace('\ufeff', '')
                 if len(clean_name) > 255:
                     clean_name = clean_name[:255]
-                cast_list.append({'Имя': clean_name, 'ID': ''})
+                cast_list.append({'Профессия': profession, 'Имя': clean_name, 'ID': ''})
         
         df_cast = pd.DataFrame(cast_list)
         
@@ -350,8 +85,9 @@ def create_excel_file(film_data, cast_data):
             worksheet_main.set_column('A:A', 25)  # Названия полей
             worksheet_main.set_column('B:B', 50)  # Значения
             
-            worksheet_cast.set_column('A:A', 40)  # Имена
-            worksheet_cast.set_column('B:B', 15)  # ID
+            worksheet_cast.set_column('A:A', 20)  # Профессии
+            worksheet_cast.set_column('B:B', 40)  # Имена
+            worksheet_cast.set_column('C:C', 15)  # ID
             
             # Добавляем форматирование заголовков
             header_format = workbook.add_format({
@@ -397,14 +133,14 @@ def create_improved_csv_file(film_data, cast_data):
         
         # Создаем DataFrame для актеров
         cast_list = []
-        for line in cast_data:
+        for profession, line in cast_data:
             if ';' in line:
                 name, staff_id = line.split(';', 1)
                 clean_name = name.strip().replace('\x00', '').replace('\ufeff', '').replace('\n', ' ').replace('\r', ' ')
-                cast_list.append({'Имя': clean_name, 'ID': staff_id.strip()})
+                cast_list.append({'Профессия': profession, 'Имя': clean_name, 'ID': staff_id.strip()})
             else:
                 clean_name = line.strip().replace('\x00', '').replace('\ufeff', '').replace('\n', ' ').replace('\r', ' ')
-                cast_list.append({'Имя': clean_name, 'ID': ''})
+                cast_list.append({'Профессия': profession, 'Имя': clean_name, 'ID': ''})
         
         df_cast = pd.DataFrame(cast_list)
         
@@ -439,12 +175,12 @@ def create_simple_csv_file(film_data, cast_data):
     
     # Создаем DataFrame для актеров
     cast_list = []
-    for line in cast_data:
+    for profession, line in cast_data:
         if ';' in line:
             name, staff_id = line.split(';', 1)
-            cast_list.append({'Имя': name.strip(), 'ID': staff_id.strip()})
+            cast_list.append({'Профессия': profession, 'Имя': name.strip(), 'ID': staff_id.strip()})
         else:
-            cast_list.append({'Имя': line.strip(), 'ID': ''})
+            cast_list.append({'Профессия': profession, 'Имя': line.strip(), 'ID': ''})
     
     df_cast = pd.DataFrame(cast_list)
     
@@ -461,13 +197,211 @@ def create_simple_csv_file(film_data, cast_data):
     # Возвращаем с UTF-8 BOM для корректного отображения
     return io.BytesIO(('\ufeff' + content).encode('utf-8'))
 
+def available_professions(cast_groups):
+    """Ключи профессий, для которых есть данные"""
+    return [key for key, _ in CAST_PROFESSIONS if cast_groups.get(key)]
+
+def format_profession(cast_groups):
+    labels = dict(CAST_PROFESSIONS)
+    return lambda key: f"{labels[key]} ({len(cast_groups.get(key, []))})"
+
+@contextmanager
+def timed(name):
+    """В режиме отладки (?debug=1) показывает время отрисовки блока под ним"""
+    started = time.perf_counter()
+    yield
+    if DEBUG_TIMINGS:
+        st.caption(f"⏱ {name}: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+def get_export_files(professions):
+    """Файлы экспорта для выбранных профессий строятся один раз и хранятся в сессии"""
+    selection = tuple(professions)
+    cached = st.session_state.export_files
+    if cached is None or cached['professions'] != selection:
+        film_data = st.session_state.film_data
+        cast_data = flatten_cast(st.session_state.cast_groups, professions)
+        excel_file = create_excel_file(film_data, cast_data)
+        csv_file = create_improved_csv_file(film_data, cast_data)
+        csv_simple_file = create_simple_csv_file(film_data, cast_data)
+        st.session_state.export_files = cached = {
+            'professions': selection,
+            'excel': excel_file.getvalue() if excel_file else None,
+            'csv': csv_file.getvalue() if csv_file else None,
+            'csv_simple': csv_simple_file.getvalue() if csv_simple_file else None,
+        }
+    return cached
+
+@st.fragment
+def render_film_info():
+    """Основная информация, описание и финансы"""
+    with timed('Результаты'):
+        film_data = st.session_state.film_data
+        
+        # Основная информация
+        st.subheader("🎭 Основная информация")
+        
+        # Отображаем информацию в виде метрик и полей
+        col_info1, col_info2 = st.columns(2)
+        
+        with col_info1:
+            st.metric("Название (RU)", film_data.get('Название (RU)', '-'))
+            st.metric("Год", film_data.get('Год', '-'))
+            st.metric("Рейтинг IMDB", film_data.get('Рейтинг IMDB', '-'))
+            st.metric("Премьера в России", film_data.get('Премьера в России', '-'))
+            st.metric("Премьера в мире", film_data.get('Премьера в мире', '-'))
+        
+        with col_info2:
+            st.metric("Оригинальное название", film_data.get('Оригинальное название', '-'))
+            st.metric("Страна", film_data.get('Страна', '-'))
+            st.metric("Рейтинг Кинопоиска", film_data.get('Рейтинг Кинопоиска', '-'))
+            st.metric("Кол-во оценок КП", film_data.get('Кол-во оценок КП', '-'))
+            st.metric("Продолжительность (мин)", film_data.get('Продолжительность (мин)', '-'))
+        
+        # Жанры отдельно на всю ширину
+        st.metric("Жанры", film_data.get('Жанры', '-'))
+        
+        # Описание
+        st.subheader("📝 Описание")
+        st.write(film_data.get('Описание', '-'))
+        
+        # Финансы
+        st.subheader("💰 Финансы")
+        col_money1, col_money2 = st.columns(2)
+        
+        with col_money1:
+            st.metric("Бюджет", film_data.get('Бюджет', '-'))
+            st.metric("Сборы в мире", film_data.get('Сборы в мире', '-'))
+        
+        with col_money2:
+            st.metric("Сборы в России", film_data.get('Сборы в России', '-'))
+            st.metric("Сборы в США", film_data.get('Сборы в США', '-'))
+
+@st.fragment
+def render_cast_table():
+    """Таблица актеров и съемочной группы: фильтры и постраничный вывод"""
+    with timed('Каст'):
+        st.subheader("🎬 Актеры и съемочная группа")
+        
+        cast_groups = st.session_state.cast_groups
+        professions = available_professions(cast_groups)
+        if not professions:
+            st.write("Нет данных о съемочной группе")
+            return
+        
+        col_filter1, col_filter2, col_filter3 = st.columns([3, 2, 1])
+        with col_filter1:
+            selected = st.multiselect("Профессии", professions, default=professions,
+                                      format_func=format_profession(cast_groups), key="cast_professions")
+        with col_filter2:
+            name_prefix = st.text_input("Имя начинается с", key="cast_prefix")
+        with col_filter3:
+            page_size = st.selectbox("На странице", CAST_PAGE_SIZES, key="cast_page_size")
+        
+        # Сначала считаем количество записей, чтобы ограничить номер страницы
+        _, total = build_cast_page(cast_groups, selected, name_prefix, 0, 0)
+        pages = max(1, -(-total // page_size))
+        if st.session_state.get('cast_page', 1) > pages:
+            st.session_state.cast_page = pages
+        page = st.number_input(f"Страница (из {pages})", min_value=1, max_value=pages, step=1, key="cast_page")
+        
+        rows, total = build_cast_page(cast_groups, selected, name_prefix, page - 1, page_size)
+        df_cast = pd.DataFrame(rows, columns=['Профессия', 'Имя', 'ID'])
+        if total:
+            st.dataframe(df_cast, use_container_width=True, hide_index=True)
+            st.caption(f"Показано {len(df_cast)} из {total}")
+        else:
+            st.write("Нет записей, подходящих под фильтр")
+
+@st.fragment
+def render_export_section():
+    """Кнопки экспорта и советы"""
+    with timed('Экспорт'):
+        st.subheader("📥 Экспорт данных")
+        
+        professions = available_professions(st.session_state.cast_groups)
+        if st.session_state.film_data and professions:
+            selected = st.multiselect("Профессии в экспорте", professions, default=professions,
+                                      format_func=format_profession(st.session_state.cast_groups),
+                                      key="export_professions")
+            export_files = get_export_files(selected)
+            # Формируем имя файла с названием фильма на русском
+            film_name_ru = str(st.session_state.film_data.get('Название (RU)', '')).strip()
+            # Очищаем от недопустимых символов для имени файла
+            safe_film_name = re.sub(r'[\\/:*?"<>|]', '', film_name_ru)
+            loaded_film_id = st.session_state.film_id
+            if safe_film_name:
+                filename = f"film_{loaded_film_id}_{safe_film_name}.xlsx"
+            else:
+                filename = f"film_{loaded_film_id}.xlsx"
+            filename_csv = filename.replace('.xlsx', '.csv')
+            
+            col_export1, col_export2 = st.columns(2)
+            
+            # on_click="ignore": скачивание не перезапускает скрипт
+            with col_export1:
+                if export_files['excel']:
+                    st.download_button(
+                        label="📊 Скачать Excel файл",
+                        data=export_files['excel'],
+                        file_name=filename,
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        key="excel_download",
+                        on_click="ignore"
+                    )
+            
+            with col_export2:
+                # CSV для Excel
+                if export_files['csv']:
+                    st.download_button(
+                        label="📄 CSV (для Excel)",
+                        data=export_files['csv'],
+                        file_name=filename_csv,
+                        mime="text/csv",
+                        key="csv_download_1",
+                        on_click="ignore"
+                    )
+                # Простой CSV
+                st.download_button(
+                    label="📋 CSV (простой)",
+                    data=export_files['csv_simple'],
+                    file_name=filename_csv,
+                    mime="text/csv",
+                    key="csv_download_2",
+                    on_click="ignore"
+                )
+        
+        # Дополнительные советы по экспорту
+        with st.expander("💡 Советы по экспорту"):
+            st.markdown("""
+            **Если возникают проблемы с Excel файлом:**
+            1. Попробуйте скачать CSV файл вместо Excel
+            2. При открытии CSV в Excel выберите разделитель "точка с запятой" (;)
+            3. Убедитесь, что у вас установлены все необходимые библиотеки
+            
+            **Форматы файлов:**
+            - **Excel**: Удобен для просмотра и редактирования
+            - **CSV для Excel**: Совместим с Excel, использует точку с запятой
+            - **CSV простой**: Универсальный формат для любых программ
+            
+            **Для установки недостающих библиотек:**
+            ```
+            pip install xlsxwriter openpyxl
+            ```
+            """)
+
 # Инициализация сессии
 if 'film_data' not in st.session_state:
     st.session_state.film_data = {}
-if 'cast_data' not in st.session_state:
-    st.session_state.cast_data = []
+if 'cast_groups' not in st.session_state:
+    st.session_state.cast_groups = empty_cast_groups()
 if 'data_source' not in st.session_state:
     st.session_state.data_source = ""
+if 'cast_degraded' not in st.session_state:
+    st.session_state.cast_degraded = False
+if 'film_id' not in st.session_state:
+    st.session_state.film_id = ""
+if 'export_files' not in st.session_state:
+    st.session_state.export_files = None
 
 # Заголовок
 st.title("🎬 Кинопоиск Парсер")
@@ -491,6 +425,7 @@ with st.sidebar:
     # Настройки получения данных
     st.subheader("📊 Настройки данных")
     use_unofficial_primary = st.checkbox("Приоритет unofficial API для каста", value=True, help="Если включено, данные о съемочной группе будут получаться в первую очередь из unofficial API")
+    use_hedged_requests = st.checkbox("Хеджированные запросы к unofficial API", value=False, help=f"Если ответ задерживается дольше {HEDGE_PERCENTILE}-го перцентиля обычного времени ответа, отправляется повторный запрос — снижает задержки при медленном сервисе")
     
     if st.button("ℹ️ Как получить API-ключи?"):
         st.info("""
@@ -519,94 +454,23 @@ with col1:
             st.error("⚠️ Введите корректный числовой ID!")
         else:
             with st.spinner("Загрузка данных..."):
-                # Получаем основную информацию
-                data, error = get_film_info(film_id, api_key)
+                # Основная информация и каст — так же, как в пакетной обработке и сервисе
+                result, error, _ = fetch_film(film_id, api_key,
+                                              unofficial_api_key if use_unofficial_primary else None,
+                                              HEDGE_PERCENTILE if use_hedged_requests else None)
                 
-                if error or not data:
-                    st.error(f"❌ {error or 'Нет данных'}")
+                if error:
+                    st.error(f"❌ {error}")
                 else:
-                    # Собираем всю информацию
-                    def safe(val):
-                        return '-' if val is None or val == '' else val
-                    
-                    # Извлекаем рейтинги
-                    rating_kp = '-'
-                    rating_imdb = '-'
-                    votes_kp = '-'
-                    
-                    if 'rating' in data:
-                        rating_data = data['rating']
-                        # Округляем рейтинг КП до одного знака после запятой
-                        kp_rating = rating_data.get('kp')
-                        if kp_rating and kp_rating != '-' and kp_rating is not None:
-                            try:
-                                rating_kp = str(round(float(kp_rating), 1))
-                            except (ValueError, TypeError):
-                                rating_kp = safe(kp_rating)
-                        else:
-                            rating_kp = '-'
-                        
-                        rating_imdb = safe(rating_data.get('imdb'))
-                    
-                    # Извлекаем количество голосов из votes.kp
-                    if 'votes' in data:
-                        votes_data = data['votes']
-                        votes_kp = format_vote_count(votes_data.get('kp'))
-                    
-                    # Извлекаем жанры
-                    genres = []
-                    if 'genres' in data:
-                        for genre in data['genres']:
-                            if isinstance(genre, dict) and 'name' in genre:
-                                genres.append(genre['name'])
-                            elif isinstance(genre, str):
-                                genres.append(genre)
-                    
-                    # Извлекаем страны
-                    countries = []
-                    if 'countries' in data:
-                        for country in data['countries']:
-                            if isinstance(country, dict) and 'name' in country:
-                                countries.append(country['name'])
-                            elif isinstance(country, str):
-                                countries.append(country)
-                    
-                    # Основная информация
-                    film_info = {
-                        'Название (RU)': safe(data.get('name')),
-                        'Оригинальное название': safe(data.get('alternativeName') or data.get('enName')),
-                        'Год': safe(data.get('year')),
-                        'Жанры': safe(', '.join(genres) if genres else '-'),
-                        'Страна': safe(', '.join(countries) if countries else '-'),
-                        'Рейтинг IMDB': safe(rating_imdb),
-                        'Рейтинг Кинопоиска': safe(rating_kp),
-                        'Кол-во оценок КП': safe(votes_kp),
-                        'Описание': safe(data.get('description')),
-                        'Продолжительность (мин)': format_duration(data.get('movieLength'))
-                    }
-                    
-                    # Касса
-                    boxoffice = get_film_boxoffice(data)
-                    film_info.update({
-                        'Бюджет': boxoffice.get('budget', '-'),
-                        'Сборы в мире': boxoffice.get('world', '-'),
-                        'Сборы в России': boxoffice.get('russia', '-'),
-                        'Сборы в США': boxoffice.get('usa', '-')
-                    })
-                    
-                    # Премьеры
-                    premiere_rf, premiere_world = get_film_premieres(data)
-                    film_info.update({
-                        'Премьера в России': safe(premiere_rf),
-                        'Премьера в мире': safe(premiere_world)
-                    })
-                    
-                    # Актеры и съемочная группа
-                    cast, data_source = get_film_cast(data, film_id, unofficial_api_key if use_unofficial_primary else None)
-                    
-                    st.session_state.film_data = film_info
-                    st.session_state.cast_data = cast
-                    st.session_state.data_source = data_source
+                    st.session_state.film_data = result['film_info']
+                    st.session_state.cast_groups = result['cast']
+                    st.session_state.data_source = result['data_source']
+                    st.session_state.cast_degraded = result['degraded']
+                    st.session_state.film_id = film_id
+                    st.session_state.export_files = None
+                    # Фильтры каста и экспорта сбрасываются для нового фильма
+                    for key in ('cast_professions', 'cast_prefix', 'cast_page', 'export_professions'):
+                        st.session_state.pop(key, None)
                     
                     st.success("✅ Данные успешно загружены!")
 
@@ -616,133 +480,15 @@ with col2:
     if st.session_state.film_data:
         # Показываем источник данных о съемочной группе
         if st.session_state.data_source:
-            st.info(f"ℹ️ {st.session_state.data_source}")
-        
-        # Основная информация
-        st.subheader("🎭 Основная информация")
-        
-        # Отображаем информацию в виде метрик и полей
-        col_info1, col_info2 = st.columns(2)
-        
-        with col_info1:
-            st.metric("Название (RU)", st.session_state.film_data.get('Название (RU)', '-'))
-            st.metric("Год", st.session_state.film_data.get('Год', '-'))
-            st.metric("Рейтинг IMDB", st.session_state.film_data.get('Рейтинг IMDB', '-'))
-            st.metric("Премьера в России", st.session_state.film_data.get('Премьера в России', '-'))
-            st.metric("Премьера в мире", st.session_state.film_data.get('Премьера в мире', '-'))
-        
-        with col_info2:
-            st.metric("Оригинальное название", st.session_state.film_data.get('Оригинальное название', '-'))
-            st.metric("Страна", st.session_state.film_data.get('Страна', '-'))
-            st.metric("Рейтинг Кинопоиска", st.session_state.film_data.get('Рейтинг Кинопоиска', '-'))
-            st.metric("Кол-во оценок КП", st.session_state.film_data.get('Кол-во оценок КП', '-'))
-            st.metric("Продолжительность (мин)", st.session_state.film_data.get('Продолжительность (мин)', '-'))
-        
-        # Жанры отдельно на всю ширину
-        st.metric("Жанры", st.session_state.film_data.get('Жанры', '-'))
-        
-        # Описание
-        st.subheader("📝 Описание")
-        st.write(st.session_state.film_data.get('Описание', '-'))
-        
-        # Финансы
-        st.subheader("💰 Финансы")
-        col_money1, col_money2 = st.columns(2)
-        
-        with col_money1:
-            st.metric("Бюджет", st.session_state.film_data.get('Бюджет', '-'))
-            st.metric("Сборы в мире", st.session_state.film_data.get('Сборы в мире', '-'))
-        
-        with col_money2:
-            st.metric("Сборы в России", st.session_state.film_data.get('Сборы в России', '-'))
-            st.metric("Сборы в США", st.session_state.film_data.get('Сборы в США', '-'))
-        
-        # Актеры и съемочная группа
-        st.subheader("🎬 Актеры и съемочная группа")
-        
-        if st.session_state.cast_data:
-            # Создаем DataFrame для отображения
-            cast_display = []
-            for line in st.session_state.cast_data:
-                if ';' in line:
-                    name, staff_id = line.split(';', 1)
-                    cast_display.append({'Имя': name.strip(), 'ID': staff_id.strip()})
-                else:
-                    cast_display.append({'Имя': line.strip(), 'ID': ''})
-            
-            if cast_display:
-                df_cast = pd.DataFrame(cast_display)
-                st.dataframe(df_cast, use_container_width=True)
+            if st.session_state.cast_degraded:
+                st.warning(f"⚠️ {st.session_state.data_source}")
             else:
-                st.write("Нет данных о съемочной группе")
-        else:
-            st.write("Нет данных о съемочной группе")
-        
-        # Кнопка экспорта
-        st.subheader("📥 Экспорт данных")
+                st.info(f"ℹ️ {st.session_state.data_source}")
         
-        col_export1, col_export2 = st.columns(2)
-        
-        with col_export1:
-            if st.session_state.film_data and st.session_state.cast_data:
-                excel_file = create_excel_file(st.session_state.film_data, st.session_state.cast_data)
-                # Формируем имя файла с названием фильма на русском
-                film_name_ru = st.session_state.film_data.get('Название (RU)', '').strip()
-                # Очищаем от недопустимых символов для имени файла
-                safe_film_name = re.sub(r'[\\/:*?"<>|]', '', film_name_ru)
-                if safe_film_name:
-                    filename = f"film_{film_id}_{safe_film_name}.xlsx"
-                else:
-                    filename = f"film_{film_id}.xlsx"
-                st.download_button(
-                    label="📊 Скачать Excel файл",
-                    data=excel_file,
-                    file_name=filename,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key="excel_download"
-                )
-        
-        with col_export2:
-            if st.session_state.film_data and st.session_state.cast_data:
-                # CSV для Excel
-                csv_file = create_improved_csv_file(st.session_state.film_data, st.session_state.cast_data)
-                filename_csv = filename.replace('.xlsx', '.csv')
-                st.download_button(
-                    label="📄 CSV (для Excel)",
-                    data=csv_file,
-                    file_name=filename_csv,
-                    mime="text/csv",
-                    key="csv_download_1"
-                )
-                # Простой CSV
-                csv_simple_file = create_simple_csv_file(st.session_state.film_data, st.session_state.cast_data)
-                filename_csv_simple = filename.replace('.xlsx', '.csv')
-                st.download_button(
-                    label="📋 CSV (простой)",
-                    data=csv_simple_file,
-                    file_name=filename_csv_simple,
-                    mime="text/csv",
-                    key="csv_download_2"
-                )
-        
-        # Дополнительные советы по экспорту
-        with st.expander("💡 Советы по экспорту"):
-            st.markdown("""
-            **Если возникают проблемы с Excel файлом:**
-            1. Попробуйте скачать CSV файл вместо Excel
-            2. При открытии CSV в Excel выберите разделитель "точка с запятой" (;)
-            3. Убедитесь, что у вас установлены все необходимые библиотеки
-            
-            **Форматы файлов:**
-            - **Excel**: Удобен для просмотра и редактирования
-            - **CSV для Excel**: Совместим с Excel, использует точку с запятой
-            - **CSV простой**: Универсальный формат для любых программ
-            
-            **Для установки недостающих библиотек:**
-            ```
-            pip install xlsxwriter openpyxl
-            ```
-            """)
+        # Каждый блок — отдельный фрагмент и перерисовывается независимо
+        render_film_info()
+        render_cast_table()
+        render_export_section()
         
     else:
         st.info("👈 Введите ID фильма и нажмите 'Получить информацию'")
@@ -750,3 +496,8 @@ with col2:
 # Футер
 st.markdown("---")
 st.markdown("**Создано с помощью Streamlit** • [Kinopoisk.dev API](https://kinopoisk.dev/)")
+
+# Время полного перезапуска скрипта (только в режиме отладки, ?debug=1).
+# Время блоков выводится внутри фрагментов и обновляется при их отдельном перезапуске
+if DEBUG_TIMINGS:
+    st.caption(f"⏱ Полный перезапуск: {(time.perf_counter() - RUN_STARTED) * 1000:.0f} мс")
@@ -0,0 +1,220 @@
+"""
+Защита запросов к вторичным источникам: circuit breaker и хеджированные запросы.
+
+Состояние хранится на уровне модуля: Streamlit перезапускает основной скрипт
+на каждое действие пользователя, а импортированные модули живут весь процесс.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+# Состояния circuit breaker
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для одного эндпоинта.
+
+    После failure_threshold подряд идущих ошибок переходит в состояние "open"
+    и на reset_timeout секунд отклоняет запросы. Затем пропускает один пробный
+    запрос ("half_open"): успех закрывает цепь, ошибка снова открывает её.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def retry_after(self):
+        """Сколько секунд осталось до пробного запроса (0, если цепь не открыта)"""
+        with self._lock:
+            if self._current_state() != STATE_OPEN:
+                return 0
+            return max(0, int(self.reset_timeout - (time.monotonic() - self._opened_at)))
+
+    def allow_request(self):
+        """Можно ли выполнять запрос сейчас. В half_open пропускается один пробный запрос"""
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных запросов для расчета перцентилей"""
+
+    def __init__(self, window=100, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Возвращает перцентиль в секундах или None, если выборка слишком мала"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+_breakers = {}
+_trackers = {}
+_registry_lock = threading.Lock()
+
+# Потоки для хеджированных запросов. Задачи отправляются в пул только при наличии
+# свободного потока, поэтому брошенные медленные запросы не задерживают новые
+HEDGE_POOL_SIZE = 32
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix='hedge')
+_hedge_slots = threading.BoundedSemaphore(HEDGE_POOL_SIZE)
+
+
+def get_breaker(endpoint):
+    """Возвращает общий для процесса circuit breaker эндпоинта"""
+    with _registry_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker()
+        return _breakers[endpoint]
+
+
+def get_latency_tracker(endpoint):
+    """Возвращает общий для процесса трекер задержек эндпоинта"""
+    with _registry_lock:
+        if endpoint not in _trackers:
+            _trackers[endpoint] = LatencyTracker()
+        return _trackers[endpoint]
+
+
+def is_failure_status(status_code):
+    """
+    Коды, говорящие о недоступности сервиса (а не о данных или ключе):
+    5xx, 429 и 402 — kinopoiskapiunofficial.tech отвечает 402 при исчерпании дневной квоты
+    """
+    return status_code >= 500 or status_code in (402, 429)
+
+
+def is_failure_response(response):
+    return is_failure_status(response.status_code)
+
+
+def _submit_if_free(fn, *args, **kwargs):
+    """Запускает задачу в пуле хеджирования, если есть свободный поток, иначе возвращает None"""
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    future = _hedge_executor.submit(fn, *args, **kwargs)
+    future.add_done_callback(lambda _: _hedge_slots.release())
+    return future
+
+
+def hedged_get(url, headers, timeout, hedge_after, session=None):
+    """
+    GET-запрос с хеджированием: если ответ не пришел за hedge_after секунд,
+    отправляется второй такой же запрос и используется первый успешный ответ.
+    Если в пуле нет свободных потоков, запрос выполняется без хеджирования.
+    """
+    http = session or requests
+    primary = _submit_if_free(http.get, url, headers=headers, timeout=timeout)
+    if primary is None:
+        return http.get(url, headers=headers, timeout=timeout)
+    futures = [primary]
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        hedge = _submit_if_free(http.get, url, headers=headers, timeout=timeout)
+        if hedge is not None:
+            futures.append(hedge)
+
+    pending = set(futures)
+    last_error = None
+    last_response = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if not is_failure_response(response):
+                return response
+            last_response = response
+    if last_response is not None:
+        return last_response
+    raise last_error
+
+
+def guarded_get(endpoint, url, headers, timeout=10, hedge_percentile=None, session=None):
+    """
+    Выполняет GET через circuit breaker эндпоинта.
+
+    Возвращает (response, error). Если цепь открыта, запрос не выполняется
+    и response равен None. При hedge_percentile (например, 95) повторный
+    запрос отправляется, когда ожидание превысило этот перцентиль задержек.
+    session — общая HTTP-сессия (по умолчанию запрос без сессии).
+    """
+    breaker = get_breaker(endpoint)
+    if not breaker.allow_request():
+        if breaker.state == STATE_HALF_OPEN:
+            return None, 'Сервис проверяется пробным запросом после сбоя'
+        return None, f'Сервис временно отключен (повтор через {breaker.retry_after()} с)'
+
+    tracker = get_latency_tracker(endpoint)
+    hedge_after = tracker.percentile(hedge_percentile) if hedge_percentile else None
+    started = time.monotonic()
+    try:
+        if hedge_after is not None:
+            response = hedged_get(url, headers, timeout, hedge_after, session)
+        else:
+            response = (session or requests).get(url, headers=headers, timeout=timeout)
+    except Exception as e:
+        breaker.record_failure()
+        return None, f'Ошибка запроса: {e}'
+
+    if is_failure_response(response):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+        tracker.record(time.monotonic() - started)
+    return response, None
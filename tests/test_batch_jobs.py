@@ -0,0 +1,77 @@
+import pytest
+
+import batch_jobs
+from job_queue import JobQueue
+
+FALLBACK = {'film_info': {}, 'cast': {'director': ['Режиссер;1'], 'actor': ['Актер;2'], 'voice_actor': []},
+            'data_source': 'kinopoisk.dev (резервный режим)', 'degraded': True}
+VOICE_ONLY = {'film_info': {}, 'cast': {'director': [], 'actor': [], 'voice_actor': []},
+              'data_source': 'Нет данных о касте', 'degraded': False}
+FULL = {'film_info': {}, 'cast': {'director': ['Режиссер;1'], 'actor': ['Актер;2', 'Актер;3']},
+        'data_source': 'Unofficial API', 'degraded': False}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    queue = JobQueue(path)
+    queue.enqueue(['1'])
+    queue.complete(queue.claim('w'), 'w', FALLBACK, degraded=True)
+    queue.close()
+    return path
+
+
+def fake_fetch(result):
+    return lambda *args: (result, None, 200)
+
+
+def test_work_without_unofficial_key_keeps_degraded(db_path, monkeypatch):
+    monkeypatch.setattr(batch_jobs, 'fetch_film', fake_fetch(VOICE_ONLY))
+    batch_jobs.main(['work', '--db', db_path, '--api-key', 'k', '--unofficial-api-key', ''])
+    queue = JobQueue(db_path)
+    assert queue.stored('1') == (FALLBACK, True)
+    queue.close()
+
+
+def test_poorer_result_does_not_replace_degraded(db_path, monkeypatch):
+    monkeypatch.setattr(batch_jobs, 'fetch_film', fake_fetch(VOICE_ONLY))
+    batch_jobs.main(['work', '--db', db_path, '--api-key', 'k', '--unofficial-api-key', 'u'])
+    queue = JobQueue(db_path)
+    assert queue.stored('1') == (FALLBACK, True)
+    assert queue.degraded_count() == 1
+    queue.close()
+
+
+def test_full_result_replaces_degraded(db_path, monkeypatch):
+    monkeypatch.setattr(batch_jobs, 'fetch_film', fake_fetch(FULL))
+    batch_jobs.main(['work', '--db', db_path, '--api-key', 'k', '--unofficial-api-key', 'u'])
+    queue = JobQueue(db_path)
+    assert queue.stored('1') == (FULL, False)
+    assert queue.degraded_count() == 0
+    queue.close()
+
+
+def test_lost_lease_is_reported(db_path, monkeypatch, capsys):
+    def fetch_while_stolen(film_id, *args):
+        # Пока воркер ждал ответа, аренда истекла и задачу забрал другой воркер
+        other = JobQueue(db_path, lease_seconds=-1)
+        assert other.claim('other') == film_id
+        other.close()
+        return FULL, None, 200
+
+    queue = JobQueue(db_path)
+    queue.enqueue(['2'])
+    queue.close()
+    monkeypatch.setattr(batch_jobs, 'fetch_film', fetch_while_stolen)
+    batch_jobs.run_worker(db_path, 'k', lease_seconds=-1, worker_id='w1')
+    captured = capsys.readouterr()
+    assert 'готово' not in captured.out
+    assert 'результат отброшен' in captured.err
+
+
+@pytest.mark.parametrize('command', [['status'], ['export', '--out', 'out.csv'], ['retry-failed']])
+def test_missing_db_is_not_created(tmp_path, command):
+    db_path = tmp_path / 'typo.db'
+    with pytest.raises(SystemExit):
+        batch_jobs.main(command + ['--db', str(db_path)])
+    assert not db_path.exists()
@@ -0,0 +1,153 @@
+import time
+
+import pytest
+
+import film_service
+from film_service import MAX_BATCH_FETCHES, FilmStore, accepts_gzip, is_not_modified, make_etag
+from job_queue import JobQueue
+
+RESULT = {'film_info': {'Название': 'Фильм'}, 'cast': {}, 'data_source': 'unofficial', 'degraded': False}
+
+
+class FetchCalls(list):
+    """Запрошенные ID; responses — ответы fetch_film по ID (по умолчанию RESULT)"""
+
+    def __init__(self):
+        super().__init__()
+        self.responses = {}
+
+    def __call__(self, film_id, api_key, unofficial_api_key=None, hedge_percentile=None):
+        self.append(film_id)
+        return self.responses.get(film_id, (dict(RESULT), None, 200))
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Подменяет fetch_film"""
+    calls = FetchCalls()
+    monkeypatch.setattr(film_service, 'fetch_film', calls)
+    return calls
+
+
+def test_store_caches_full_result(fetches):
+    store = FilmStore('key')
+    (payload, _), error = store.get('1')
+    assert error is None and payload['id'] == '1'
+    store.get('1')
+    assert fetches == ['1']
+
+
+def test_store_does_not_cache_degraded_result(fetches):
+    fetches.responses['1'] = (dict(RESULT, degraded=True), None, 200)
+    store = FilmStore('key')
+    store.get('1')
+    store.get('1')
+    assert fetches == ['1', '1']
+
+
+@pytest.mark.parametrize('status, expected', [(404, 404), (500, 502), (None, 502)])
+def test_store_maps_errors(fetches, status, expected):
+    fetches.responses['1'] = (None, 'ошибка', status)
+    assert FilmStore('key').get('1') == (None, (expected, 'ошибка'))
+
+
+
+def test_last_modified_kept_while_data_unchanged(fetches, monkeypatch):
+    fetches.responses['1'] = (dict(RESULT, degraded=True), None, 200)
+    store = FilmStore('key')
+    clock = [1000.0]
+    monkeypatch.setattr(film_service.time, 'time', lambda: clock[0])
+    (_, first), _ = store.get('1')
+    clock[0] += 600
+    (_, second), _ = store.get('1')
+    assert second == first == 1000
+    # Данные изменились — время изменения обновляется
+    fetches.responses['1'] = (dict(RESULT, degraded=True, data_source='другой'), None, 200)
+    (_, third), _ = store.get('1')
+    assert third == 1600
+
+def test_store_without_api_key(fetches):
+    assert FilmStore(None).get('1')[1][0] == 503
+    assert fetches == []
+
+
+def test_store_reads_jobs_db(fetches, tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    queue = JobQueue(db_path)
+    queue.enqueue(['1', '2'])
+    queue.complete(queue.claim('w'), 'w', RESULT)
+    queue.complete(queue.claim('w'), 'w', dict(RESULT, degraded=True), degraded=True)
+    queue.close()
+
+    store = FilmStore('key', jobs_db=db_path)
+    (payload, _), _ = store.get('1')
+    assert payload['film_info'] == RESULT['film_info']
+    # Результат резервного режима запрашивается заново
+    store.get('2')
+    assert fetches == ['2']
+
+
+def test_store_survives_missing_jobs_db(fetches, tmp_path):
+    db_path = tmp_path / 'missing.db'
+    store = FilmStore('key', jobs_db=str(db_path))
+    assert store.get('1')[1] is None
+    assert fetches == ['1']
+    assert not db_path.exists()
+
+
+
+def test_get_many_caps_upstream_fetches(fetches):
+    store = FilmStore('key')
+    store.get('0')
+    ids = [str(i) for i in range(MAX_BATCH_FETCHES + 5)]
+    entries, errors = store.get_many(ids)
+    # '0' уже в кэше и в лимит не входит
+    assert sorted(entries, key=int) == ids[:MAX_BATCH_FETCHES + 1]
+    assert sorted(errors, key=int) == ids[MAX_BATCH_FETCHES + 1:]
+    assert all(status == 503 for status, _ in errors.values())
+    assert fetches.count('0') == 1
+    assert len(fetches) == MAX_BATCH_FETCHES + 1
+
+def test_get_many_fetches_in_parallel(monkeypatch):
+    def slow_fetch_film(film_id, *args):
+        time.sleep(0.2)
+        return dict(RESULT), None, 200
+
+    monkeypatch.setattr(film_service, 'fetch_film', slow_fetch_film)
+    started = time.monotonic()
+    entries, errors = FilmStore('key').get_many([str(i) for i in range(8)])
+    assert len(entries) == 8 and not errors
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('', False),
+    ('gzip', True),
+    ('deflate, gzip;q=0.5', True),
+    ('gzip;q=0', False),
+    ('*', True),
+    ('*;q=0', False),
+    ('gzip;q=0, *', False),
+    ('br', False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_is_not_modified_etag():
+    etag = make_etag(b'{}')
+    assert is_not_modified({'If-None-Match': etag}, etag, 100)
+    assert is_not_modified({'If-None-Match': f'"other", W/{etag}'}, etag, 100)
+    assert is_not_modified({'If-None-Match': '*'}, etag, 100)
+    assert not is_not_modified({'If-None-Match': '"other"'}, etag, 100)
+    # If-None-Match приоритетнее If-Modified-Since
+    assert not is_not_modified({'If-None-Match': '"other"',
+                                'If-Modified-Since': 'Thu, 01 Jan 2099 00:00:00 GMT'}, etag, 100)
+
+
+def test_is_not_modified_since():
+    etag = make_etag(b'{}')
+    assert is_not_modified({'If-Modified-Since': 'Thu, 01 Jan 1970 00:01:40 GMT'}, etag, 100)
+    assert not is_not_modified({'If-Modified-Since': 'Thu, 01 Jan 1970 00:01:39 GMT'}, etag, 100)
+    assert not is_not_modified({'If-Modified-Since': 'вчера'}, etag, 100)
+    assert not is_not_modified({}, etag, 100)
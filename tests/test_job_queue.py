@@ -0,0 +1,153 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+
+from job_queue import JobQueue, STATE_DONE, STATE_FAILED, STATE_PENDING
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+def test_enqueue_ignores_duplicates(db_path):
+    queue = JobQueue(db_path)
+    assert queue.enqueue(['1', '2']) == 2
+    assert queue.enqueue(['2', '3']) == 1
+    assert queue.stats()[STATE_PENDING] == 3
+    queue.close()
+
+
+def test_claim_in_order_and_complete(db_path):
+    queue = JobQueue(db_path)
+    queue.enqueue(['1', '2'])
+    assert queue.claim('w1') == '1'
+    assert queue.claim('w2') == '2'
+    assert queue.claim('w3') is None
+    assert queue.complete('1', 'w1', {'cast': {}})
+    # Чужая аренда — результат отброшен
+    assert not queue.complete('2', 'w1', {'cast': {}})
+    assert queue.stats()[STATE_DONE] == 1
+    assert queue.get_result('1')[0] == {'cast': {}}
+    queue.close()
+
+
+def test_fail_retries_until_max_attempts(db_path):
+    queue = JobQueue(db_path, max_attempts=2)
+    queue.enqueue(['1'])
+    queue.fail(queue.claim('w'), 'w', 'ошибка 1')
+    assert queue.stats()[STATE_PENDING] == 1
+    queue.fail(queue.claim('w'), 'w', 'ошибка 2')
+    assert queue.failed() == [('1', 2, 'ошибка 2')]
+    assert queue.retry_failed() == 1
+    assert queue.claim('w') == '1'
+    queue.close()
+
+
+def test_expired_lease_is_reclaimed_then_failed(db_path):
+    queue = JobQueue(db_path, lease_seconds=-1, max_attempts=2)
+    queue.enqueue(['1'])
+    assert queue.claim('w1') == '1'
+    # Аренда уже истекла — задачу забирает другой воркер
+    assert queue.claim('w2') == '1'
+    assert not queue.complete('1', 'w1', {})
+    # Попытки исчерпаны
+    assert queue.claim('w3') is None
+    assert queue.stats()[STATE_FAILED] == 1
+    queue.close()
+
+
+def test_release_does_not_count_attempt(db_path):
+    queue = JobQueue(db_path, max_attempts=1)
+    queue.enqueue(['1'])
+    queue.release(queue.claim('w'), 'w')
+    queue.fail(queue.claim('w'), 'w', 'ошибка')
+    assert queue.failed() == [('1', 1, 'ошибка')]
+    queue.close()
+
+
+def test_degraded_results_are_hidden_and_requeued(db_path):
+    queue = JobQueue(db_path)
+    queue.enqueue(['1'])
+    queue.complete(queue.claim('w'), 'w', {'cast': {}}, degraded=True)
+    assert queue.degraded_count() == 1
+    assert queue.get_result('1') is None
+    assert [degraded for _, _, degraded in queue.completed()] == [True]
+    assert queue.requeue_degraded() == 1
+    assert queue.claim('w') == '1'
+    queue.close()
+
+
+def test_degraded_result_survives_failed_refresh(db_path):
+    queue = JobQueue(db_path, max_attempts=2)
+    queue.enqueue(['1'])
+    queue.complete(queue.claim('w'), 'w', {'cast': {'actor': ['A;1']}}, degraded=True)
+    queue.requeue_degraded()
+    # Во время обновления прежний результат остается в экспорте
+    assert queue.claim('w') == '1'
+    assert list(queue.completed()) == [('1', {'cast': {'actor': ['A;1']}}, True)]
+    queue.fail('1', 'w', 'ошибка 1')
+    queue.fail(queue.claim('w'), 'w', 'ошибка 2')
+    assert queue.stats()[STATE_DONE] == 1
+    assert queue.failed() == []
+    assert queue.stored('1') == ({'cast': {'actor': ['A;1']}}, True)
+    assert queue.degraded_count() == 1
+    queue.close()
+
+
+def test_degraded_result_survives_expired_refresh_lease(db_path):
+    queue = JobQueue(db_path, lease_seconds=-1, max_attempts=1)
+    queue.enqueue(['1'])
+    queue.complete(queue.claim('w'), 'w', {'cast': {}}, degraded=True)
+    queue.requeue_degraded()
+    queue.claim('w')
+    assert queue.claim('w2') is None
+    assert queue.stats()[STATE_DONE] == 1
+    assert [film_id for film_id, _, _ in queue.completed()] == ['1']
+    queue.close()
+
+
+def test_read_only(db_path):
+    with pytest.raises(sqlite3.OperationalError):
+        JobQueue(db_path, read_only=True)
+
+    queue = JobQueue(db_path)
+    queue.enqueue(['1'])
+    queue.complete(queue.claim('w'), 'w', {'cast': {}})
+    queue.close()
+
+    reader = JobQueue(db_path, read_only=True)
+    assert reader.get_result('1')[0] == {'cast': {}}
+    with pytest.raises(sqlite3.OperationalError):
+        reader.enqueue(['2'])
+    reader.close()
+
+
+def _claim_all(db_path, worker_id, results):
+    queue = JobQueue(db_path)
+    while True:
+        film_id = queue.claim(worker_id)
+        if film_id is None:
+            break
+        queue.complete(film_id, worker_id, {})
+        results.put(film_id)
+    queue.close()
+
+
+def test_concurrent_workers_claim_each_job_once(db_path):
+    queue = JobQueue(db_path)
+    queue.enqueue([str(i) for i in range(60)])
+    queue.close()
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_claim_all, args=(db_path, f'w{i}', results))
+               for i in range(4)]
+    for worker in workers:
+        worker.start()
+    claimed = [results.get(timeout=30) for _ in range(60)]
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert sorted(claimed, key=int) == [str(i) for i in range(60)]
+    assert results.empty()
@@ -0,0 +1,220 @@
+import pytest
+
+import kinopoisk_api
+import resilience
+from kinopoisk_api import (UNOFFICIAL_API_STAFF, ResponseCache, build_cast_page, empty_cast_groups,
+                           flatten_cast, get_film_cast, get_film_info, get_staff_from_unofficial_api)
+
+
+@pytest.fixture
+def cast_groups():
+    groups = empty_cast_groups()
+    groups['director'] = ['Режиссер;1']
+    groups['actor'] = ['Актер Один;2', 'Актер Два;3', 'Борис;4']
+    groups['composer'] = ['Композитор']
+    return groups
+
+
+ALL = ['director', 'actor', 'composer']
+
+
+def names(rows):
+    return [row['Имя'] for row in rows]
+
+
+def test_flatten_cast_keeps_profession_order(cast_groups):
+    assert flatten_cast(cast_groups) == [
+        ('Режиссер', 'Режиссер;1'),
+        ('Актеры', 'Актер Один;2'),
+        ('Актеры', 'Актер Два;3'),
+        ('Актеры', 'Борис;4'),
+        ('Композитор', 'Композитор'),
+    ]
+
+
+def test_flatten_cast_professions_subset(cast_groups):
+    # Порядок задается CAST_PROFESSIONS, а не переданным набором
+    assert flatten_cast(cast_groups, ['composer', 'director']) == [
+        ('Режиссер', 'Режиссер;1'), ('Композитор', 'Композитор'),
+    ]
+    assert flatten_cast(cast_groups, []) == []
+
+
+def test_cast_page_count_only(cast_groups):
+    assert build_cast_page(cast_groups, ALL, '', 0, 0) == ([], 5)
+
+
+@pytest.mark.parametrize('page, expected', [
+    (0, ['Режиссер', 'Актер Один']),
+    (1, ['Актер Два', 'Борис']),
+    (2, ['Композитор']),
+    (3, []),
+])
+def test_cast_page_boundaries_across_professions(cast_groups, page, expected):
+    rows, total = build_cast_page(cast_groups, ALL, '', page, 2)
+    assert names(rows) == expected
+    assert total == 5
+
+
+def test_cast_page_rows(cast_groups):
+    rows, _ = build_cast_page(cast_groups, ALL, '', 2, 2)
+    assert rows == [{'Профессия': 'Композитор', 'Имя': 'Композитор', 'ID': ''}]
+
+
+def test_cast_page_prefix_filter(cast_groups):
+    rows, total = build_cast_page(cast_groups, ALL, '  аКТ ', 0, 50)
+    assert names(rows) == ['Актер Один', 'Актер Два']
+    assert total == 2
+
+
+def test_cast_page_professions_filter(cast_groups):
+    rows, total = build_cast_page(cast_groups, ['actor'], '', 1, 2)
+    assert names(rows) == ['Борис']
+    assert total == 3
+
+
+FILM = {'persons': [
+    {'id': 10, 'name': 'Режиссер ДЕВ', 'enProfession': 'director', 'profession': 'режиссеры'},
+    {'id': 11, 'name': 'Дубляж', 'enProfession': 'actor', 'profession': 'актеры дубляжа'},
+]}
+STAFF = [{'staffId': 1, 'nameRu': 'Режиссер', 'professionKey': 'DIRECTOR'}]
+
+
+@pytest.fixture
+def staff_response(monkeypatch):
+    """Подменяет get_staff_from_unofficial_api; ответ задается через staff_response.value"""
+    class Fake:
+        value = (STAFF, None, 200)
+
+    monkeypatch.setattr(kinopoisk_api, 'get_staff_from_unofficial_api', lambda *args: Fake.value)
+    monkeypatch.setattr(resilience, '_breakers', {})
+    return Fake
+
+
+def test_cast_from_unofficial_api(staff_response):
+    cast_groups, data_source, degraded = get_film_cast(FILM, 1, 'key')
+    assert not degraded
+    assert cast_groups['director'] == ['Режиссер;1']
+    assert cast_groups['voice_actor'] == ['Дубляж;11']
+    assert data_source.startswith('Unofficial API:') and 'kinopoisk.dev: актеры дубляжа' in data_source
+
+
+@pytest.mark.parametrize('status, text', [
+    (404, 'Unofficial API: нет данных о съемочной группе'),
+    (401, 'Unofficial API: ключ не принят (401)'),
+    (403, 'Unofficial API: ключ не принят (403)'),
+    (400, 'Unofficial API: ошибка 400'),
+])
+def test_cast_client_errors_are_not_fallback(staff_response, status, text):
+    staff_response.value = ([], 'ошибка', status)
+    cast_groups, data_source, degraded = get_film_cast(FILM, 1, 'key')
+    assert not degraded
+    assert cast_groups['director'] == []
+    assert cast_groups['voice_actor'] == ['Дубляж;11']
+    assert data_source == f'{text}, kinopoisk.dev: актеры дубляжа'
+
+
+@pytest.mark.parametrize('status, reason', [
+    (500, 'unofficial API вернул ошибку 500'),
+    (429, 'unofficial API вернул ошибку 429'),
+    (402, 'unofficial API вернул ошибку 402'),
+    (None, 'unofficial API не ответил'),
+])
+def test_cast_fallback_on_failures(staff_response, status, reason):
+    staff_response.value = ([], 'ошибка', status)
+    cast_groups, data_source, degraded = get_film_cast(FILM, 1, 'key')
+    assert degraded
+    assert cast_groups['director'] == ['Режиссер ДЕВ;10']
+    assert cast_groups['voice_actor'] == ['Дубляж;11']
+    assert data_source.startswith(f'kinopoisk.dev (резервный режим: {reason})')
+
+
+def test_cast_fallback_without_persons(staff_response):
+    staff_response.value = ([], 'ошибка', 503)
+    cast_groups, data_source, degraded = get_film_cast({}, 1, 'key')
+    assert degraded
+    assert not any(cast_groups.values())
+    assert data_source == 'Нет данных о касте (unofficial API вернул ошибку 503)'
+
+
+def test_cast_fallback_with_open_breaker(staff_response):
+    breaker = resilience.get_breaker(UNOFFICIAL_API_STAFF)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    staff_response.value = ([], 'Сервис временно отключен', None)
+    _, data_source, degraded = get_film_cast(FILM, 1, 'key')
+    assert degraded
+    assert 'unofficial API отключен, повтор через' in data_source
+
+
+def test_cast_fallback_while_breaker_probes(staff_response, monkeypatch):
+    breaker = resilience.get_breaker(UNOFFICIAL_API_STAFF)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    now = resilience.time.monotonic() + breaker.reset_timeout
+    monkeypatch.setattr(resilience.time, 'monotonic', lambda: now)
+    # Пробный запрос уже выполняется в другом потоке
+    assert breaker.allow_request()
+    staff_response.value = ([], 'Сервис проверяется пробным запросом после сбоя', None)
+    _, data_source, degraded = get_film_cast(FILM, 1, 'key')
+    assert degraded
+    assert 'unofficial API проверяется после сбоя' in data_source
+
+
+def test_cast_without_unofficial_key(staff_response):
+    cast_groups, data_source, degraded = get_film_cast(FILM, 1, None)
+    assert not degraded
+    assert cast_groups['director'] == []
+    assert data_source == 'kinopoisk.dev: актеры дубляжа'
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.text = ''
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class KeyCheckingSession:
+    """Отвечает 200 только на ключ 'good', на остальные — 401"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls += 1
+        if headers['X-API-KEY'] != 'good':
+            return FakeResponse(401)
+        return FakeResponse(200, STAFF if 'staff' in url else {'name': 'Фильм'})
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = KeyCheckingSession()
+    monkeypatch.setattr(kinopoisk_api, 'get_http_session', lambda: fake)
+    monkeypatch.setattr(kinopoisk_api, 'film_cache', ResponseCache())
+    monkeypatch.setattr(kinopoisk_api, 'staff_cache', ResponseCache())
+    monkeypatch.setattr(resilience, '_breakers', {})
+    return fake
+
+
+def test_film_cache_is_per_api_key(session):
+    assert get_film_info(1, 'good') == ({'name': 'Фильм'}, None, 200)
+    assert get_film_info(1, 'good')[2] == 200
+    assert session.calls == 1
+    # Данные, загруженные с другим ключом, не отдаются
+    data, error, status = get_film_info(1, 'bad')
+    assert data is None and error and status == 401
+    assert session.calls == 2
+
+
+def test_staff_cache_is_per_api_key(session):
+    assert get_staff_from_unofficial_api(1, 'good') == (STAFF, None, 200)
+    assert get_staff_from_unofficial_api(1, 'good') == (STAFF, None, 200)
+    assert session.calls == 1
+    staff_data, error, status = get_staff_from_unofficial_api(1, 'bad')
+    assert staff_data == [] and error and status == 401
+    assert session.calls == 2
@@ -0,0 +1,66 @@
+"""
+Проверки интерфейса через streamlit.testing (запросы к API подменяются).
+Время перезапуска при листании каста не должно расти с размером каста.
+"""
+import os
+import statistics
+import time
+from unittest import mock
+
+import pytest
+
+AppTest = pytest.importorskip('streamlit.testing.v1').AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'kinopoisk_parser.py')
+
+
+def fake_session_get(cast_size):
+    film = {'name': 'Фильм', 'persons': []}
+    staff = [{'staffId': i, 'nameRu': f'Актер {i}', 'professionKey': 'ACTOR'} for i in range(cast_size)]
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        response = mock.Mock(status_code=200, text='')
+        response.json.return_value = staff if 'unofficial' in url else film
+        return response
+
+    return get
+
+
+def load_film(cast_size):
+    """Загружает фильм с cast_size актерами (ID фильма уникален, чтобы не попасть в кэш)"""
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.run()
+    app.text_input[0].input(str(cast_size)).run()
+    app.button[0].click().run()
+    return app
+
+
+def paging_rerun_time(cast_size, runs=7):
+    """Медиана времени перезапуска при переключении страницы каста, с"""
+    with mock.patch('requests.Session.get', fake_session_get(cast_size)):
+        app = load_film(cast_size)
+        assert not app.exception
+        timings = []
+        for run in range(runs):
+            started = time.perf_counter()
+            app.number_input(key='cast_page').set_value(2 + run % 2).run()
+            timings.append(time.perf_counter() - started)
+        assert app.caption[-1].value == f'Показано 50 из {cast_size}'
+    return statistics.median(timings)
+
+
+def test_cast_paging_rerun_time_is_flat():
+    small = paging_rerun_time(200)
+    large = paging_rerun_time(20000)
+    # Страница строится из 50 записей независимо от размера каста;
+    # запас на шум измерений
+    assert large < small * 3 + 0.2, (small, large)
+
+
+def test_load_error_is_shown():
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        return mock.Mock(status_code=404, text='')
+
+    with mock.patch('requests.Session.get', get):
+        app = load_film(404)
+    assert [error.value for error in app.error] == ['Фильм с ID 404 не найден']
@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+import resilience
+from resilience import (CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN,
+                        guarded_get, hedged_get, is_failure_status)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience.time, 'monotonic', fake)
+    return fake
+
+
+class FakeResponse:
+    def __init__(self, status_code, name=''):
+        self.status_code = status_code
+        self.name = name
+
+
+class FakeSession:
+    """Отдает ответы по очереди; delays — задержка каждого вызова"""
+
+    def __init__(self, responses, delays=()):
+        self.responses = list(responses)
+        self.delays = list(delays)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        if index < len(self.delays):
+            time.sleep(self.delays[index])
+        response = self.responses[index]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow_request()
+    clock.now += 30
+    assert breaker.retry_after() == 30
+
+
+def test_breaker_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+
+
+@pytest.mark.parametrize('status, failure', [
+    (200, False), (401, False), (404, False), (402, True), (429, True), (500, True), (503, True),
+])
+def test_is_failure_status(status, failure):
+    assert is_failure_status(status) is failure
+
+
+def test_guarded_get_counts_failures(monkeypatch):
+    monkeypatch.setattr(resilience, '_breakers', {})
+    session = FakeSession([FakeResponse(500)] * 3)
+    for _ in range(3):
+        response, error = guarded_get('test', 'http://x', {}, session=session)
+        assert error is None and response.status_code == 500
+    response, error = guarded_get('test', 'http://x', {}, session=session)
+    assert response is None and 'отключен' in error
+    assert session.calls == 3
+
+
+def test_guarded_get_404_is_not_failure(monkeypatch):
+    monkeypatch.setattr(resilience, '_breakers', {})
+    session = FakeSession([FakeResponse(404)] * 5)
+    for _ in range(5):
+        guarded_get('test', 'http://x', {}, session=session)
+    assert resilience.get_breaker('test').state == STATE_CLOSED
+
+
+def test_hedged_get_fast_primary_sends_one_request():
+    session = FakeSession([FakeResponse(200, 'primary')])
+    assert hedged_get('http://x', {}, 5, 0.5, session).name == 'primary'
+    assert session.calls == 1
+
+
+def test_hedged_get_slow_primary_uses_hedge():
+    session = FakeSession([FakeResponse(200, 'primary'), FakeResponse(200, 'hedge')], delays=[1.0, 0])
+    started = time.monotonic()
+    assert hedged_get('http://x', {}, 5, 0.05, session).name == 'hedge'
+    assert time.monotonic() - started < 0.5
+
+
+def test_hedged_get_skips_failed_response():
+    session = FakeSession([FakeResponse(200, 'primary'), FakeResponse(503, 'hedge')], delays=[0.3, 0])
+    assert hedged_get('http://x', {}, 5, 0.05, session).name == 'primary'
+
+
+def test_hedged_get_raises_when_all_fail():
+    session = FakeSession([ValueError('primary'), ValueError('hedge')], delays=[0.2, 0])
+    with pytest.raises(ValueError):
+        hedged_get('http://x', {}, 5, 0.05, session)
+
+
+def test_hedged_get_without_free_threads_runs_inline(monkeypatch):
+    monkeypatch.setattr(resilience, '_hedge_slots', threading.BoundedSemaphore(1))
+    resilience._hedge_slots.acquire()
+    session = FakeSession([FakeResponse(200, 'inline')])
+    assert hedged_get('http://x', {}, 5, 0.05, session).name == 'inline'
+    assert session.calls == 1
+
+
+def test_guarded_get_reports_probe_in_flight(monkeypatch, clock):
+    monkeypatch.setattr(resilience, '_breakers', {})
+    breaker = resilience.get_breaker('test')
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    clock.now += breaker.reset_timeout
+    assert breaker.allow_request()
+    response, error = guarded_get('test', 'http://x', {}, session=FakeSession([]))
+    assert response is None and 'пробным запросом' in error